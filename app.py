@@ -2,13 +2,32 @@
 import os
 import re
 import json
-from typing import Dict, Any, List
+import time
+import signal
+import threading
+from collections import Counter, deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Iterable, Iterator, NamedTuple, Optional, Tuple
 
-import pytesseract
 from PIL import Image, ImageOps, ImageFilter
 import fitz  # PyMuPDF
 import pandas as pd
 
+from outputs import NDJSONWriter, ColumnarWriter, ndjson_to_json, ndjson_to_excel
+import outputs
+from manifest import RunManifest, file_signature
+from money import InvoiceTotals, format_paise, gst_split, rate_hundredths, to_paise
+from records import InvoiceHeader, InvoiceItem, materialize
+import ocr_layout
+import preprocess
+from ocr_backend import engine_name, get_backend
+from ocr_cache import OCRCache, make_key, file_digest, buffer_digest
+from pattern_registry import PatternRegistry, HEADER_FIELDS, load_patterns, item_flags
+import regex_guard
+from metrics import METRICS, Metrics
+from regex_guard import PatternStats, run_guarded
+
 
 # ================= CONFIG ================= #
 
@@ -17,105 +36,431 @@ OUTPUT_DIR = "output"
 
 JSON_OUTPUT = os.path.join(OUTPUT_DIR, "result.json")
 EXCEL_OUTPUT = os.path.join(OUTPUT_DIR, "result.xlsx")
+# Rows are streamed here per invoice; JSON/Excel are derived from it at the end
+NDJSON_OUTPUT = os.path.join(OUTPUT_DIR, "result.ndjson")
+# Typed columnar copy (decimal amounts, date invoice_date, dictionary-encoded
+# vendor/gst_rate) written in row groups as files complete; ".arrow" gives Arrow
+# IPC. The output to load for large runs - Excel gets slow past ~10k rows.
+# Needs pyarrow; None disables it.
+COLUMNAR_OUTPUT = os.path.join(OUTPUT_DIR, "result.parquet")
+
+# Per-file record of completed work; with RESUME unchanged files are not re-run
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "manifest.sqlite")
+RESUME = True
 
 SUPPORTED_EXT = {".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff"}
 
+# GSTIN/PAN -> vendor table used before the supplier_name regexes
+VENDOR_MASTER = "vendors.json"
+
+# CPU seconds one regex evaluation may take before it is skipped (0 = only time it)
+PATTERN_BUDGET = 1.0
+PATTERN_TIMINGS = os.path.join(OUTPUT_DIR, "pattern_timings.json")
+
+# Invoices processed this run whose rows don't add up to their printed totals
+TOTALS_CHECK = os.path.join(OUTPUT_DIR, "totals_check.json")
+
+# Per-stage wall/CPU/bytes totals written at the end of a run (JSON and
+# Prometheus text format); set METRICS_TRACE to also log every stage per file
+METRICS_JSON = os.path.join(OUTPUT_DIR, "metrics.json")
+METRICS_PROM = os.path.join(OUTPUT_DIR, "metrics.prom")
+METRICS_TRACE = None  # e.g. os.path.join(OUTPUT_DIR, "trace.ndjson")
+
+# Batch mode: worker processes used by main() (1 = process files in-process)
+WORKERS = os.cpu_count() or 1
+# Seconds a single file may take before it is reported as timed out (0 = no limit)
+FILE_TIMEOUT = 600
+# Scanned pages OCR'd concurrently within one PDF; also the max rendered pages held in memory.
+# Pool workers split the cores between them instead (see page_workers())
+PAGE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Tesseract settings - also part of the OCR cache key (OCR_ENGINE as the engine it resolves to)
+OCR_LANG = "eng"
+OCR_CONFIG = "--psm 6"
+OCR_DPI = 300
+# "auto" = long-lived tesserocr handles when installed, else pytesseract (see ocr_backend)
+OCR_ENGINE = "auto"
+# Probe scanned pages at low DPI, then OCR only their text blocks at a DPI
+# picked from the line height (ocr_layout.MIN_DPI..MAX_DPI) instead of OCR_DPI
+ADAPTIVE_DPI = False
+# Render scanned pages as 8-bit grayscale, wrapped as an image over the pixmap
+# buffer instead of copied into a separate RGB image (the OCR engine still
+# takes its own copy: pytesseract a PNG, tesserocr the raw bytes)
+OCR_GRAYSCALE = True
+
+# Pages with a text layer still get their images OCR'd when an image covers at
+# least OCR_IMAGE_MIN_AREA of the page and text covers < OCR_TEXT_COVERAGE of it
+OCR_IMAGE_MIN_AREA = 0.05
+OCR_TEXT_COVERAGE = 0.10
+
+# Image files (photos) are turned upright and deskewed before OCR
+AUTO_DESKEW = True
+
+# Watch mode (watch.py): INPUT_FOLDERS are rescanned every WATCH_POLL seconds
+# (or watched with watchdog when installed); a file is picked up once its size
+# and mtime have not changed for WATCH_SETTLE seconds
+WATCH_POLL = 2.0
+WATCH_SETTLE = 2.0
+
+# Service mode (service.py): local HTTP API; uploads beyond the workers that are
+# busy wait in a queue of SERVICE_QUEUE, and are refused with 503 once it is full
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_QUEUE = 2 * WORKERS
+SERVICE_MAX_UPLOAD = 50 * 1024 * 1024
+
+# Persistent OCR text cache (set OCR_CACHE_DIR = None to disable)
+OCR_CACHE_DIR = ".ocr_cache"
+OCR_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
 
 # ================= OCR ================= #
 
-def preprocess_image(img: Image.Image) -> Image.Image:
-    # No preprocessing - return original image for maximum OCR accuracy
-    # Tesseract handles preprocessing internally better than custom code
-    return img
+def preprocess_image(img: Image.Image, profile: str = "none") -> Image.Image:
+    # "none" by default - Tesseract's own binarization does best on clean
+    # renders; noisy scans can opt into a profile per vendor (preprocess.py)
+    return preprocess.apply(img, profile)
+
+
+def load_image(path: str) -> Image.Image:
+    """
+    Open an image file upright: EXIF orientation first, then with AUTO_DESKEW
+    the estimated quarter turn and skew. The angles are cached per file
+    content, so re-runs skip the estimate.
+    """
+    img = ImageOps.exif_transpose(Image.open(path))
+    if not AUTO_DESKEW:
+        return img
+
+    cache = get_ocr_cache()
+    key = make_key("angle", preprocess.ORIENT_VERSION, file_digest(path)) if cache is not None else ""
+    angle = cache.get_angle(key) if cache is not None else None
+    with METRICS.stage("orient"):
+        if angle is None:
+            angle = preprocess.estimate_rotation(img)
+            if cache is not None:
+                cache.put_angle(key, *angle)
+        return preprocess.correct(img, *angle)
+
+
+def preprocess_profile(patterns: Dict[str, Dict[str, Any]], vendor: str = "default") -> str:
+    """The vendor's "preprocess" setting, else the default vendor's, else none"""
+    cfg = patterns.get(vendor) or patterns.get("default") or {}
+    return cfg.get("preprocess") or (patterns.get("default") or {}).get("preprocess") or "none"
+
+
+_ocr_cache = None
+
+
+def get_ocr_cache():
+    global _ocr_cache
+    if _ocr_cache is None and OCR_CACHE_DIR:
+        _ocr_cache = OCRCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES)
+    return _ocr_cache
+
+
+_ocr_backend = None
+
+
+def get_ocr_backend():
+    global _ocr_backend
+    if _ocr_backend is None:
+        _ocr_backend = get_backend(OCR_ENGINE)
+    return _ocr_backend
+
+
+def _tesseract(img: Image.Image, lang: str, config: str, profile: str = "none", page: int = None) -> str:
+    if profile != "none":
+        with METRICS.stage("preprocess", page):
+            img = preprocess_image(img, profile)
+    with METRICS.stage("tesseract", page) as m:
+        text = get_ocr_backend().image_to_string(img, lang, config)
+        m["bytes"] = len(text)
+    return text
+
+
+def ocr_image_to_text(img: Image.Image, lang: str = OCR_LANG, config: str = OCR_CONFIG,
+                      profile: str = "none") -> str:
+    cache = get_ocr_cache()
+    if cache is None:
+        return _tesseract(img, lang, config, profile)
+
+    digest = buffer_digest(f"{img.mode}{img.size}".encode(), img.tobytes())
+    key_parts = ["image", digest, engine_name(OCR_ENGINE), lang, config]
+    if profile != "none":
+        key_parts.append(profile)
+    key = make_key(*key_parts)
+    text = cache.get(key)
+    if text is None:
+        text = _tesseract(img, lang, config, profile)
+        cache.put(key, text)
+    return text
+
+
+def _merge_rects(rects: List["fitz.Rect"]) -> List["fitz.Rect"]:
+    merged = []
+    for rect in rects:
+        rect = fitz.Rect(rect)
+        for other in [m for m in merged if m.intersects(rect)]:
+            merged.remove(other)
+            rect |= other
+        merged.append(rect)
+    return merged
+
+
+def plan_page(page) -> List[tuple]:
+    """
+    Decide what to take from the text layer and what to OCR on one page.
+    Returns ("text", str) / ("ocr", clip) segments in reading order, where
+    clip None means the whole page:
+      - no text layer                  -> OCR the whole page
+      - images the text doesn't cover  -> text blocks + OCR of those regions
+        (e.g. a scan with only a stamp/footer in the text layer, or a
+        born-digital page with a pasted image of the item table)
+      - otherwise                      -> the text layer as is
+    """
+    text = page.get_text().strip()
+    if not text:
+        return [("ocr", None)]
+
+    page_area = abs(page.rect)
+    blocks = [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+    regions = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & page.rect
+        if rect.is_empty or abs(rect) < OCR_IMAGE_MIN_AREA * page_area:
+            continue
+        covered = sum(abs(fitz.Rect(b[:4]) & rect) for b in blocks)
+        if covered < OCR_TEXT_COVERAGE * abs(rect):
+            regions.append(rect)
+
+    if not regions:
+        return [("text", text)]
 
+    regions = _merge_rects(regions)
+    segments = [(r.y0, r.x0, "ocr", r) for r in regions]
+    for b in blocks:
+        r = fitz.Rect(b[:4])
+        center = fitz.Point((r.x0 + r.x1) / 2, (r.y0 + r.y1) / 2)
+        # Text inside an OCR'd region is read from the render instead
+        if not any(center in reg for reg in regions):
+            segments.append((r.y0, r.x0, "text", b[4].strip()))
 
-def ocr_image_to_text(img: Image.Image) -> str:
-    img = preprocess_image(img)
-    return pytesseract.image_to_string(img, lang="eng", config="--psm 6")
+    segments.sort(key=lambda s: (s[0], s[1]))
+    return [(kind, value) for _, _, kind, value in segments]
 
 
-def ocr_pdf_to_text(path: str) -> str:
+# Pixmaps rendered for OCR in this process (benchmark.py reads these)
+RENDER_STATS: Counter = Counter()
+
+
+def _drop_tracebacks(error: BaseException) -> None:
+    """Clear the traceback of an exception and of those chained to it, releasing their frames"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        error.__traceback__ = None
+        error = error.__cause__ or error.__context__
+
+
+def ocr_pdf_to_text(path: str, workers: int = None, profile: str = "none") -> str:
+    """
+    Text layer where it covers the page, OCR for whatever it doesn't (see
+    plan_page()). Pages/regions are rendered here (PyMuPDF is not
+    thread-safe) and OCR'd on a thread pool; a semaphore keeps at most
+    `workers` renders alive. Text is joined in page and reading order.
+    Cached regions are answered without rendering at all.
+
+    With ADAPTIVE_DPI each region is probed first (see ocr_layout) and only
+    its text blocks are rendered, at the DPI their line height calls for.
+    `profile` is the preprocessing applied to every render before OCR.
+    `workers` defaults to PAGE_WORKERS, or this pool worker's share of the cores.
+    """
+    workers = max(1, workers or _PAGE_WORKERS)
+    cache = get_ocr_cache()
+    digest = file_digest(path) if cache is not None else ""
     doc = fitz.open(path)
     pages = []
+    slots = threading.BoundedSemaphore(workers)
+
+    def ocr_region(key: str, render: list, page: int) -> str:
+        # render = [pix, img]; img may be a view on pix, so it is dropped first
+        try:
+            text = _tesseract(render[1], OCR_LANG, OCR_CONFIG, profile, page)
+        except Exception as e:
+            # The traceback's frames still hold img - let them go before pix
+            _drop_tracebacks(e)
+            raise
+        finally:
+            render.pop()
+            render.clear()
+            slots.release()
+        if cache is not None:
+            cache.put(key, text)
+        return text
 
-    for page in doc:
-        text = page.get_text().strip()
-        if text:
-            pages.append(text)
-        else:
-            pix = page.get_pixmap(dpi=300)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            pages.append(ocr_image_to_text(img))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for index, page in enumerate(doc):
+                parts = []
+                with METRICS.stage("text_layer", index) as m:
+                    plan = plan_page(page)
+                    m["bytes"] = sum(len(value) for kind, value in plan if kind == "text")
+                for kind, clip in plan:
+                    if kind == "text":
+                        parts.append(clip)
+                        continue
+
+                    if ADAPTIVE_DPI:
+                        with METRICS.stage("probe", index):
+                            dpi, regions = ocr_layout.probe(page, clip)
+                        RENDER_STATS["probes"] += 1
+                        jobs = [(dpi, region) for region in regions]
+                    else:
+                        jobs = [(OCR_DPI, clip)]
+
+                    for dpi, region in jobs:
+                        key_parts = ["pdf", digest, index, dpi, engine_name(OCR_ENGINE), OCR_LANG, OCR_CONFIG]
+                        if OCR_GRAYSCALE:
+                            key_parts.append("gray")
+                        if profile != "none":
+                            key_parts.append(profile)
+                        if region is not None:
+                            key_parts.append(tuple(round(c, 2) for c in region))
+                        key = make_key(*key_parts)
+                        cached = cache.get(key) if cache is not None else None
+                        if cached is not None:
+                            parts.append(cached)
+                            continue
+
+                        slots.acquire()
+                        with METRICS.stage("render", index) as m:
+                            if OCR_GRAYSCALE:
+                                pix = page.get_pixmap(dpi=dpi, clip=region, colorspace=fitz.csGRAY, alpha=False)
+                                # Shares the pixmap's samples - pix has to outlive img
+                                img = Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv,
+                                                       "raw", "L", pix.stride, 1)
+                            else:
+                                pix = page.get_pixmap(dpi=dpi, clip=region)
+                                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                            size = m["bytes"] = pix.stride * pix.height
+                        RENDER_STATS["renders"] += 1
+                        RENDER_STATS["pixels"] += pix.width * pix.height
+                        RENDER_STATS["bytes"] += size
+                        RENDER_STATS["peak_bytes"] = max(RENDER_STATS["peak_bytes"], size)
+                        parts.append(pool.submit(ocr_region, key, [pix, img], index))
+                        del img, pix
+                pages.append(parts)
+
+            pages = ["\n".join(p if isinstance(p, str) else p.result() for p in parts) for parts in pages]
+    finally:
+        doc.close()
 
-    doc.close()
     return "\n".join(pages)
 
 
 # ================= REGEX HELPER ================= #
 
-def rx(text: str, pattern: Any) -> str:
-    if not text or not pattern:
-        return ""
+def _first_match(text: str, pattern: Any):
+    # Compiled entries from PatternRegistry: tuple of patterns tried in order
+    if isinstance(pattern, (tuple, list)):
+        for p in pattern:
+            m = p.search(text)
+            if m:
+                return m
+        return None
 
+    if isinstance(pattern, re.Pattern):
+        return pattern.search(text)
+
+    # Raw patterns.json entries
     if isinstance(pattern, dict):
         for k in ("primary", "fallback"):
             p = pattern.get(k)
             if p:
                 m = re.search(p, text, re.I | re.S)
                 if m:
-                    return (m.group(m.lastindex) if m.lastindex else m.group(0)).strip()
-        return ""
+                    return m
+        return None
 
     if isinstance(pattern, str):
-        m = re.search(pattern, text, re.I | re.S)
-        if m:
-            return (m.group(m.lastindex) if m.lastindex else m.group(0)).strip()
+        return re.search(pattern, text, re.I | re.S)
 
+    return None
+
+
+def rx(text: str, pattern: Any) -> str:
+    if not text or not pattern:
+        return ""
+
+    m = _first_match(text, pattern)
+    if m:
+        return (m.group(m.lastindex) if m.lastindex else m.group(0)).strip()
     return ""
 
 
 # ================= VENDOR DETECTION ================= #
 
+def detect_vendor_candidates(text: str, patterns: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Every vendor whose supplier_name matches, in patterns.json order"""
+    index = getattr(patterns, "vendor_index", None)
+    if index is not None:
+        return index.matches(text)
+
+    return [
+        vendor for vendor, cfg in patterns.items()
+        if vendor != "default" and cfg.get("supplier_name") and _first_match(text, cfg["supplier_name"])
+    ]
+
+
+# How each vendor was resolved: gstin / pan / regex / default, plus pages where
+# more than one vendor's supplier_name matched ("ambiguous")
+DETECTION_STATS: Counter = Counter()
+
+
 def detect_vendor(text: str, patterns: Dict[str, Dict[str, Any]]) -> str:
-    for vendor, cfg in patterns.items():
-        if vendor == "default":
-            continue
-        name_pat = cfg.get("supplier_name")
-        if name_pat and re.search(name_pat, text, re.I | re.S):
+    # Fast path: the supplier GSTIN (or its PAN) is a direct key into the vendor master
+    master = getattr(patterns, "vendor_master", None)
+    if master is not None:
+        vendor, how = master.lookup(text)
+        if vendor:
+            DETECTION_STATS[how] += 1
             return vendor
-    return "default"
+
+    matches = detect_vendor_candidates(text, patterns)
+    DETECTION_STATS["regex" if matches else "default"] += 1
+    if not matches:
+        return "default"
+    if len(matches) > 1:
+        # Keep the first vendor in patterns.json order; the clash shows in the VENDOR summary
+        DETECTION_STATS["ambiguous"] += 1
+    return matches[0]
 
 
 # ================= HEADER EXTRACTION ================= #
 
 def extract_header(text: str, vendor: str, patterns: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    # Compiled registry: all fields from a single anchor scan of the text
+    if isinstance(patterns, PatternRegistry):
+        return {"vendor": vendor, **patterns.header_engine(vendor).extract(text)}
+
     pat = patterns.get(vendor, patterns.get("default", {}))
 
-    return {
-        "vendor": vendor,
-        "invoice_number": rx(text, pat.get("invoice_number")),
-        "invoice_date": rx(text, pat.get("invoice_date")),
-        "supplier_name": rx(text, pat.get("supplier_name")),
-        "supplier_gstin": rx(text, pat.get("supplier_gstin")),
-        "supplier_pan": rx(text, pat.get("supplier_pan")),
-        "supplier_address": rx(text, pat.get("supplier_address")),
-        "supplier_phone_no": rx(text, pat.get("supplier_phone_no")),
-        "supplier_email": rx(text, pat.get("supplier_email_id")),  # ✅ FIXED
-        "account_holder_name": rx(text, pat.get("account_holder_name")),
-        "account_number": rx(text, pat.get("account_number")),
-        "ifsc_code": rx(text, pat.get("ifsc_code")),
-        "buyer_name": rx(text, pat.get("buyer_name")),
-        "buyer_gstin": rx(text, pat.get("buyer_gstin")),
-        "taxable_total": rx(text, pat.get("taxable_total")),
-        "cgst_total_amount": rx(text, pat.get("cgst_total_amount")),
-        "sgst_total_amount": rx(text, pat.get("sgst_total_amount")),
-        "igst_total_amount": rx(text, pat.get("igst_total_amount")),
-        "grand_total": rx(text, pat.get("grand_total")),
-    }
+    header = {"vendor": vendor}
+    for key, field in HEADER_FIELDS:
+        header[key] = rx(text, pat.get(field))
+    return header
 
 
 # ================= SMART ITEM EXTRACTION ================= #
 
+# Look for lines with: text + 8-digit HSN/code + qty + price + unit + gst + amount
+SMART_ITEM_LINE = re.compile(
+    r'^[\s&:|,0-9/\\.]*(.{3,80}?)\s+([2-9]\d{7})\s+(\d+)\s+([0-9.]+)\s*[|:;]*\s*([A-Za-z}]{2,6})\s*[|:;]*\s*([0-9]{1,2})\s+([0-9,]+\\.\\d{2}|\\d+\\.\\d{2})',
+    re.I,
+)
+
+
 def extract_items_smart(text: str) -> List[Dict[str, str]]:
     """
     Intelligent fallback extraction for ANY invoice layout.
@@ -135,10 +480,7 @@ def extract_items_smart(text: str) -> List[Dict[str, str]]:
         if any(skip in line.upper() for skip in ['GSTIN', 'EMAIL', 'STATE', 'BANK', 'SUBJECT', 'TOTAL', 'TAXABLE', 'INVOICE', 'DATE', 'M/S', 'RUPEES', 'GRAND']):
             continue
         
-        # Look for lines with: text + 8-digit HSN/code + qty + price + unit + gst + amount
-        pattern = r'^[\s&:|,0-9/\\.]*(.{3,80}?)\s+([2-9]\d{7})\s+(\d+)\s+([0-9.]+)\s*[|:;]*\s*([A-Za-z}]{2,6})\s*[|:;]*\s*([0-9]{1,2})\s+([0-9,]+\\.\\d{2}|\\d+\\.\\d{2})'
-        
-        m = re.match(pattern, line, re.I)
+        m = SMART_ITEM_LINE.match(line)
         if m:
             try:
                 row = {
@@ -329,20 +671,24 @@ def extract_items_rk_security(text: str) -> List[Dict[str, str]]:
 def extract_items(text: str, vendor: str, patterns: Dict[str, Dict[str, Any]]) -> List[Dict[str, str]]:
     pat = patterns.get(vendor, {})
     items = []
+    size = len(text)
 
     # Special handling for specific vendors
     if vendor == "shri_sivaayam_traders":
-        items = extract_items_shri_sivaayam(text)
+        items = run_guarded(lambda: extract_items_shri_sivaayam(text), vendor, "items_shri_sivaayam", size, default=[])
     elif vendor == "rk_security_services":
-        items = extract_items_rk_security(text)
+        items = run_guarded(lambda: extract_items_rk_security(text), vendor, "items_rk_security", size, default=[])
     else:
-        for rule in pat.get("item_patterns", []):
-            # Use appropriate flags based on vendor
-            flags = re.I | re.M  # Use re.M for multiline matching
-            if vendor != "shine_traders":  # For other vendors, use re.S if needed
-                flags |= re.S
-            
-            for m in re.finditer(rule["regex"], text, flags):
+        for i, rule in enumerate(pat.get("item_patterns", [])):
+            regex = rule["regex"]
+            if isinstance(regex, re.Pattern):
+                # Already compiled by PatternRegistry with the vendor's flags
+                finditer = regex.finditer
+            else:
+                finditer = lambda t, r=regex: re.finditer(r, t, item_flags(vendor))
+
+            matches = run_guarded(lambda: list(finditer(text)), vendor, f"item_patterns[{i}]", size, default=[])
+            for m in matches:
                 row = {}
                 for k, v in rule["mapping"].items():
                     row[k] = m.group(v) if isinstance(v, int) else v
@@ -350,7 +696,7 @@ def extract_items(text: str, vendor: str, patterns: Dict[str, Dict[str, Any]]) -
 
     # Fallback: If no items found with vendor patterns, try smart extraction
     if not items:
-        items = extract_items_smart(text)
+        items = run_guarded(lambda: extract_items_smart(text), vendor, "items_smart", size, default=[])
     
     return items
 
@@ -358,18 +704,40 @@ def extract_items(text: str, vendor: str, patterns: Dict[str, Dict[str, Any]]) -
 # ================= FILE PROCESS ================= #
 
 def process_file(path: str, patterns: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return materialize(extract_records(path, patterns))
+
+
+def extract_records(path: str, patterns: Dict[str, Dict[str, Any]]) -> List[InvoiceItem]:
+    """process_file() before the rows are flattened: one InvoiceItem per line, sharing the header"""
     ext = os.path.splitext(path)[1].lower()
     if ext not in SUPPORTED_EXT:
         return []
 
-    text = ocr_pdf_to_text(path) if ext == ".pdf" else ocr_image_to_text(Image.open(path))
-    vendor = detect_vendor(text, patterns)
-
-    header = extract_header(text, vendor, patterns)
-    items = extract_items(text, vendor, patterns)
-
+    def ocr(profile: str) -> str:
+        if ext == ".pdf":
+            return ocr_pdf_to_text(path, profile=profile)
+        return ocr_image_to_text(load_image(path), profile=profile)
+
+    # "text" spans the whole text acquisition; text_layer/render/tesseract... are inside it
+    profile = preprocess_profile(patterns)
+    with METRICS.stage("text", nbytes=os.path.getsize(path)):
+        text = ocr(profile)
+    with METRICS.stage("detect_vendor", nbytes=len(text)):
+        vendor = detect_vendor(text, patterns)
+    # The vendor is only known after a first OCR pass; redo it if they want other preprocessing
+    vendor_profile = preprocess_profile(patterns, vendor)
+    if vendor_profile != profile:
+        with METRICS.stage("text", nbytes=os.path.getsize(path)):
+            text = ocr(vendor_profile)
+
+    with METRICS.stage("extract_header", nbytes=len(text)):
+        header = extract_header(text, vendor, patterns)
+    with METRICS.stage("extract_items", nbytes=len(text)):
+        items = extract_items(text, vendor, patterns)
+
+    header = InvoiceHeader(header, os.path.basename(path))
     if items:
-        return [{**header, **item, "file_name": os.path.basename(path)} for item in items]
+        return [InvoiceItem(header, item) for item in items]
     else:
         # If no items extracted, still output the header with empty item fields
         default_item = {
@@ -387,7 +755,7 @@ def process_file(path: str, patterns: Dict[str, Dict[str, Any]]) -> List[Dict[st
             "sgst_amount": "",
             "igst_amount": ""
         }
-        return [{**header, **default_item, "file_name": os.path.basename(path)}]
+        return [InvoiceItem(header, default_item)]
 
 
 # ================= POST PROCESSING ================= #
@@ -404,12 +772,38 @@ def clean_number(value: str) -> float:
         return 0.0
 
 
-def post_process(rows: List[Dict[str, Any]]) -> None:
-    """Enhanced post-processing with stronger calculations and validation"""
+NUMBER_FIELDS = ['taxable_total', 'cgst_total_amount', 'sgst_total_amount',
+                 'igst_total_amount', 'grand_total', 'amount', 'unit_price', 'quantity']
+
+# Every output row has these keys
+REQUIRED_FIELDS = [
+    "vendor", "invoice_number", "invoice_date", "supplier_name", "supplier_gstin",
+    "supplier_pan", "supplier_address", "supplier_phone_no", "supplier_email",
+    "account_holder_name", "account_number", "ifsc_code", "buyer_name", "buyer_gstin",
+    "taxable_total", "cgst_total_amount", "sgst_total_amount", "igst_total_amount", "grand_total",
+    "item_name", "hsn_code", "quantity", "unit", "unit_price", "amount",
+    "gst_rate", "HSN/SAC_type", "supply_type", "voucher_type",
+    "cgst_amount", "sgst_amount", "igst_amount", "file_name"
+]
+
+# GST rate forced by HSN code
+HSN_GST_RATES = {
+    "25232930": "28",  # Cement
+    "84289010": "28",  # Unloading/handling services
+    "87049011": "18",  # Transport services
+}
+
+
+def post_process(rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Enhanced post-processing with stronger calculations and validation.
+    Returns the invoices whose rows don't add up to their stated totals
+    (InvoiceTotals.checks()).
+    """
+    totals = InvoiceTotals()
     for r in rows:
         # 1. Clean number fields
-        for field in ['taxable_total', 'cgst_total_amount', 'sgst_total_amount', 
-                      'igst_total_amount', 'grand_total', 'amount', 'unit_price', 'quantity']:
+        for field in NUMBER_FIELDS:
             if field in r and r[field]:
                 try:
                     r[field] = str(clean_number(r[field]))
@@ -433,32 +827,25 @@ def post_process(rows: List[Dict[str, Any]]) -> None:
         if r.get("account_number"):
             r["account_number"] = re.sub(r'\s+', '', r["account_number"])
         
-        # 5. Strong GST and amount calculations
+        # 5. GST split of the amount, in integer paise (money.py)
         amt_raw = r.get("amount", "")
-        rate = float(r.get("gst_rate", 0) or 0)
-        
+        rate = rate_hundredths(r.get("gst_rate", 0))
+        amount = to_paise(amt_raw)
+        split = None
+
         if amt_raw and rate > 0:
-            try:
-                amt = clean_number(amt_raw)
-                if amt > 0:
-                    # Calculate taxable amount (amount without GST)
-                    taxable_amt = amt / (1 + rate/100)
-                    gst_total = amt - taxable_amt
-                    
-                    # Check if IGST or CGST+SGST based on existing data or default to CGST+SGST
-                    if not r.get("igst_total_amount") or clean_number(r.get("igst_total_amount", 0)) == 0:
-                        r["cgst_amount"] = f"{gst_total/2:.2f}"
-                        r["sgst_amount"] = f"{gst_total/2:.2f}" 
-                        r["igst_amount"] = "0"
-                    else:
-                        r["igst_amount"] = f"{gst_total:.2f}"
-                        r["cgst_amount"] = "0"
-                        r["sgst_amount"] = "0"
-            except Exception as e:
-                # Keep existing values if calculation fails
-                r["cgst_amount"] = r.get("cgst_amount", "")
-                r["sgst_amount"] = r.get("sgst_amount", "")
-                r["igst_amount"] = r.get("igst_amount", "")
+            if amount > 0:
+                # IGST if the invoice has an IGST total, otherwise CGST+SGST
+                inter = bool(r.get("igst_total_amount")) and to_paise(r.get("igst_total_amount")) != 0
+                split = gst_split(amount, rate, inter)
+                if not inter:
+                    r["cgst_amount"] = format_paise(split[0])
+                    r["sgst_amount"] = format_paise(split[1])
+                    r["igst_amount"] = "0"
+                else:
+                    r["igst_amount"] = format_paise(split[2])
+                    r["cgst_amount"] = "0"
+                    r["sgst_amount"] = "0"
         else:
             # Keep existing values if no amount/rate
             if not r.get("cgst_amount"):
@@ -469,17 +856,7 @@ def post_process(rows: List[Dict[str, Any]]) -> None:
                 r["igst_amount"] = ""
         
         # 6. Ensure all required fields exist
-        required_fields = [
-            "vendor", "invoice_number", "invoice_date", "supplier_name", "supplier_gstin",
-            "supplier_pan", "supplier_address", "supplier_phone_no", "supplier_email",
-            "account_holder_name", "account_number", "ifsc_code", "buyer_name", "buyer_gstin",
-            "taxable_total", "cgst_total_amount", "sgst_total_amount", "igst_total_amount", "grand_total",
-            "item_name", "hsn_code", "quantity", "unit", "unit_price", "amount",
-            "gst_rate", "HSN/SAC_type", "supply_type", "voucher_type",
-            "cgst_amount", "sgst_amount", "igst_amount", "file_name"
-        ]
-        
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             if field not in r:
                 r[field] = ""
         
@@ -490,45 +867,305 @@ def post_process(rows: List[Dict[str, Any]]) -> None:
         
         # 8. Fix specific GST rate corrections based on HSN codes
         hsn = r.get("hsn_code", "")
-        if hsn == "25232930":  # Cement
-            r["gst_rate"] = "28"
-        elif hsn == "84289010":  # Unloading/handling services 
-            r["gst_rate"] = "28"
-        elif hsn == "87049011":  # Transport services
-            r["gst_rate"] = "18"
+        if hsn in HSN_GST_RATES:
+            r["gst_rate"] = HSN_GST_RATES[hsn]
 
+        # 9. Add the row to its invoice's totals check
+        if split is None:
+            split = (to_paise(r["cgst_amount"]), to_paise(r["sgst_amount"]), to_paise(r["igst_amount"]))
+        totals.add(r, amount, *split)
 
-# ================= MAIN ================= #
+    return totals.checks()
 
-def main():
-    print("🔥 RUNNING OCR INVOICE ENGINE 🔥")
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+# ================= BATCH ================= #
+
+class FileResult(NamedTuple):
+    path: str
+    rows: List[InvoiceItem]     # materialize() gives the row dicts
+    error: str
+    seconds: float
+    counters: Dict[str, int] = {}
+    pattern_stats: Dict[str, Any] = {}
+    metrics: Dict[str, Any] = {}
+    # manifest.file_signature() taken before the file was read
+    signature: Optional[Tuple[int, int, str]] = None
+
+
+class FileTimeout(Exception):
+    pass
+
+
+_WORKER_PATTERNS: Dict[str, Dict[str, Any]] = {}
+# Page threads per PDF in this process: PAGE_WORKERS, or page_workers() in a pool worker
+_PAGE_WORKERS = PAGE_WORKERS
+
+
+def page_workers(workers: int) -> int:
+    """Page threads for each of `workers` pool processes, so together they don't exceed the cores"""
+    return max(1, min(PAGE_WORKERS, (os.cpu_count() or 1) // max(1, workers)))
+
+
+def _init_worker(patterns: Dict[str, Dict[str, Any]], page_threads: int = 1) -> None:
+    global _WORKER_PATTERNS, _PAGE_WORKERS
+    _WORKER_PATTERNS = patterns
+    _PAGE_WORKERS = page_threads
+    # Parallelism comes from the pool - keep each tesseract single-threaded
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
-    with open("patterns.json", "r", encoding="utf-8") as f:
-        patterns = json.load(f)
 
-    all_rows = []
+def _raise_file_timeout(signum, frame):
+    raise FileTimeout()
 
-    for root, dirs, files in os.walk('.'):
+
+def _process_file_task(path: str, patterns: Dict[str, Dict[str, Any]] = None,
+                       timeout: float = FILE_TIMEOUT) -> FileResult:
+    """Run process_file() and capture errors/timeouts instead of raising"""
+    if patterns is None:
+        patterns = _WORKER_PATTERNS
+    # Before the file is read: the manifest records the version the rows came from
+    signature = file_signature(path)
+
+    # The timeout is enforced with SIGALRM, which only exists on POSIX and
+    # can only be armed from the main thread (true for pool workers)
+    use_alarm = bool(timeout) and hasattr(signal, "setitimer") \
+        and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_file_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    regex_guard.BUDGET = PATTERN_BUDGET
+    regex_guard.STATS.reset()
+    METRICS.reset()
+
+    start = time.perf_counter()
+    detection_before = Counter(DETECTION_STATS)
+    rows, error = [], ""
+    try:
+        # Records, not dicts: the header goes back to the parent once per file
+        rows = extract_records(path, patterns)
+    except FileTimeout:
+        error = f"timed out after {timeout}s"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    # One write per file for the cache's hit/miss counts, not one per lookup
+    if _ocr_cache is not None:
+        _ocr_cache.flush()
+
+    counters = {f"vendor_{k}": v for k, v in (DETECTION_STATS - detection_before).items()}
+    return FileResult(path, rows, error, time.perf_counter() - start, counters,
+                      regex_guard.STATS.to_dict(), METRICS.to_dict(), signature)
+
+
+def _run_pool(pending: deque, patterns: Dict[str, Dict[str, Any]],
+              workers: int, timeout: float) -> Iterator[FileResult]:
+    """
+    Drain `pending` through one process pool, yielding results in input order.
+    If a worker process dies the pool is unusable: the unfinished paths are put
+    back at the front of `pending` and the generator stops.
+    """
+    pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(patterns, page_workers(workers)))
+    inflight = deque()
+    try:
+        while pending or inflight:
+            # Keep a bounded window in flight so finished rows don't pile up
+            while pending and len(inflight) < workers * 2:
+                path = pending.popleft()
+                inflight.append((path, pool.submit(_process_file_task, path, None, timeout)))
+
+            path, future = inflight[0]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                pending.extendleft(reversed([p for p, _ in inflight]))
+                return
+            inflight.popleft()
+            yield result
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def process_files(paths: Iterable[str], patterns: Dict[str, Dict[str, Any]],
+                  workers: int = WORKERS, timeout: float = FILE_TIMEOUT) -> Iterator[FileResult]:
+    """
+    Run process_file() over `paths` and yield one FileResult per path, in input order.
+    With workers > 1 the files are fanned out over a process pool. A file that
+    raises, times out or crashes its worker is reported in FileResult.error
+    instead of aborting the batch.
+    """
+    if workers <= 1:
+        for path in paths:
+            yield _process_file_task(path, patterns, timeout)
+        return
+
+    pending = deque(paths)
+    strikes = defaultdict(int)
+
+    while pending:
+        head = pending[0]
+        if strikes[head] >= 2:
+            # The pool died twice while waiting on this file - run it alone
+            # so a crash can be pinned on it without taking others down
+            single = deque([pending.popleft()])
+            results = list(_run_pool(single, patterns, 1, timeout))
+            yield results[0] if results else FileResult(head, [], "worker process crashed", 0.0)
+            continue
+
+        yield from _run_pool(pending, patterns, workers, timeout)
+        if pending:
+            strikes[pending[0]] += 1
+
+
+def iter_input_files(top: str = ".") -> Iterator[str]:
+    """Walk `top` in a stable (sorted) order and yield supported invoice files"""
+    for root, dirs, files in os.walk(top):
+        dirs.sort()
         if 'output' in root or 'inv_x' in root:
             continue
-        for file in files:
-            all_rows.extend(process_file(os.path.join(root, file), patterns))
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() in SUPPORTED_EXT:
+                yield os.path.join(root, file)
+
+
+# ================= MAIN ================= #
+
+def run_fingerprint(patterns: PatternRegistry) -> str:
+    """
+    What the manifest's stored rows depend on: patterns.json and vendors.json
+    (patterns.fingerprint), the OCR engine and settings, and the thresholds
+    plan_page() splits text layer from OCR by. A file recorded under a
+    different fingerprint is processed again.
+    """
+    return make_key(patterns.fingerprint, engine_name(OCR_ENGINE), OCR_LANG, OCR_CONFIG, OCR_DPI, OCR_GRAYSCALE,
+                    ADAPTIVE_DPI, AUTO_DESKEW, OCR_IMAGE_MIN_AREA, OCR_TEXT_COVERAGE,
+                    preprocess.ORIENT_VERSION)
+
+
+def main(workers: int = WORKERS):
+    print("🔥 RUNNING OCR INVOICE ENGINE 🔥")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # Compiled and validated once; a bad regex stops the run here
+    patterns = load_patterns("patterns.json", VENDOR_MASTER)
+
+    cache = get_ocr_cache()
+    cache_before = cache.stats() if cache is not None else {}
+
+    manifest = RunManifest(MANIFEST_PATH)
+    fingerprint = run_fingerprint(patterns)
+    paths = list(iter_input_files('.'))
+    done = {p for p in paths if manifest.is_done(p, fingerprint)} if RESUME else set()
+    results = process_files((p for p in paths if p not in done), patterns, workers=workers)
+
+    writer = NDJSONWriter(NDJSON_OUTPUT)
+    columnar = ColumnarWriter(COLUMNAR_OUTPUT) if COLUMNAR_OUTPUT and outputs.pa is not None else None
+    trace = NDJSONWriter(METRICS_TRACE) if METRICS_TRACE else None
+    failures = []
+    totals_checks = []
+    counters = Counter()
+    pattern_stats = PatternStats()
+    run_metrics = Metrics()
+    run_start = time.perf_counter()
+
+    # Walk in input order: completed files replay their stored rows, the rest
+    # come off the pool (which yields in the same order)
+    for path in paths:
+        if path in done:
+            stored = manifest.rows(path)
+            writer.write(stored)
+            if columnar is not None:
+                columnar.write(stored)
+            continue
 
-    post_process(all_rows)
+        result = next(results)
+        counters.update(result.counters)
+        pattern_stats.merge(result.pattern_stats)
+        for slow in result.pattern_stats.get("skipped", []):
+            print(f" ⏱ {result.path}: {slow['vendor']}.{slow['field']} skipped after "
+                  f"{slow['elapsed']:.2f}s on {slow['input_chars']} chars")
+        if result.error:
+            failures.append(result)
+            print(f" ✗ {result.path}: {result.error}")
+
+        # post_process() works row by row, so each file can be written as it lands
+        run_metrics.merge(result.metrics)
+        rows = materialize(result.rows)
+        with run_metrics.stage("post_process", nbytes=len(rows)):
+            totals_checks.extend(post_process(rows))
+        with run_metrics.stage("write"):
+            writer.write(rows)
+            if columnar is not None:
+                columnar.write(rows)
+            manifest.record(result.path, fingerprint, rows, result.seconds, result.error, result.signature)
+        if trace is not None:
+            trace.write([{"file": result.path, "seconds": round(result.seconds, 6), "error": result.error,
+                          "events": result.metrics.get("events", []) + run_metrics.events}])
+        run_metrics.events.clear()
+
+    writer.close()
+    if columnar is not None:
+        columnar.close()
+    manifest.close()
+    if trace is not None:
+        trace.close()
 
     # JSON output
-    with open(JSON_OUTPUT, "w", encoding="utf-8") as f:
-        json.dump({"Data": all_rows}, f, indent=2)
+    ndjson_to_json(NDJSON_OUTPUT, JSON_OUTPUT)
 
     # Excel output
-    if all_rows:
-        pd.DataFrame(all_rows).to_excel(EXCEL_OUTPUT, index=False)
+    if writer.rows:
+        ndjson_to_excel(NDJSON_OUTPUT, EXCEL_OUTPUT)
+
+    # Slowest patterns, for tuning patterns.json
+    with open(PATTERN_TIMINGS, "w", encoding="utf-8") as f:
+        json.dump({"slowest": pattern_stats.slowest(50), "skipped": pattern_stats.skipped}, f, indent=2)
+
+    with open(TOTALS_CHECK, "w", encoding="utf-8") as f:
+        json.dump(totals_checks, f, indent=2)
+
+    # Where the time went, per stage
+    processed = len(paths) - len(done)
+    totals = {"files": processed, "failed": len(failures), "resumed": len(done), "rows": writer.rows,
+              "wall_seconds": round(time.perf_counter() - run_start, 4)}
+    with open(METRICS_JSON, "w", encoding="utf-8") as f:
+        json.dump({**totals, "stages": run_metrics.summary()}, f, indent=2)
+    with open(METRICS_PROM, "w", encoding="utf-8") as f:
+        f.write(run_metrics.to_prometheus(extra={
+            "files_processed": processed, "files_failed": len(failures),
+            "files_resumed": len(done), "rows_written": writer.rows,
+        }))
 
     print("EXTRACTION COMPLETE")
+    print(f" NDJSON: {NDJSON_OUTPUT}")
     print(f" JSON  : {JSON_OUTPUT}")
     print(f" EXCEL : {EXCEL_OUTPUT}")
+    if columnar is not None:
+        print(f" TYPED : {COLUMNAR_OUTPUT}")
+    elif COLUMNAR_OUTPUT:
+        print(f" TYPED : skipped ({COLUMNAR_OUTPUT} needs pyarrow)")
+    print(f" REGEX : {PATTERN_TIMINGS}")
+    print(f" TOTALS: {TOTALS_CHECK} ({len({(c['file_name'], c['invoice_number']) for c in totals_checks})} "
+          f"invoice(s) not adding up)")
+    print(f" METRICS: {METRICS_JSON}, {METRICS_PROM}" + (f", {METRICS_TRACE}" if trace is not None else ""))
+    if run_metrics.stages:
+        print(run_metrics.report())
+    if cache is not None:
+        stats = cache.stats()
+        print(f" OCR CACHE: {stats['hits'] - cache_before['hits']} hits, "
+              f"{stats['misses'] - cache_before['misses']} misses "
+              f"({stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB)")
+    detection = {k[len("vendor_"):]: v for k, v in counters.items() if k.startswith("vendor_")}
+    if detection:
+        print(" VENDOR: " + ", ".join(f"{k}={v}" for k, v in sorted(detection.items())))
+    if done:
+        print(f" RESUMED: {len(done)} unchanged file(s) reused from {MANIFEST_PATH}")
+    if failures:
+        print(f" FAILED: {len(failures)} file(s)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,605 @@
+# File - benchmark.py
+"""
+Benchmarks for the invoice pipeline.
+
+    python benchmark.py header [--repeat N] [--text FILE ...]
+    python benchmark.py ocr [--folder DIR]
+    python benchmark.py render [--folder DIR]
+    python benchmark.py preprocess [--folder DIR]
+    python benchmark.py postprocess [--rows N] [--text FILE ...]
+    python benchmark.py records [--rows N] [--text FILE ...]
+    python benchmark.py suite [--folder DIR] [--copies N] [--pages 1 3 ...] [--workers N]
+                              [--synthetic N] [--synthetic-scanned F]
+                              [--stages ...] [--baseline FILE] [--save-baseline] [--tolerance T]
+
+Without --text the OCR text of every invoice under invoice/ is used (served
+from the OCR cache after the first run). The ocr stage always runs Tesseract
+(cache disabled) on the PDFs under --folder; render does the same in one
+subprocess per mode so each gets its own peak RSS. postprocess times
+post_process() on --rows rows made from those texts (with amounts and
+quantities varied per row).
+records measures the memory (and pickled size) of --rows extracted rows held
+as flat dicts against InvoiceHeader/InvoiceItem records.
+
+The suite times every stage in isolation plus the whole batch pipeline over
+a scaled corpus built from --folder (each document padded to every --pages
+count, --copies times) plus --synthetic generated invoices (synth_invoices.py,
+--synthetic-scanned of them as image-only scans), with the OCR cache off. It reports throughput,
+p50/p95 latency and peak RSS per stage and compares them with the stored
+baseline (benchmarks/baseline.json, written by --save-baseline); any stage
+slower than the baseline by more than --tolerance fails the run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import multiprocessing
+import tempfile
+import subprocess
+from typing import Any, Callable, Dict, List
+
+import app
+
+
+def load_texts(text_files: List[str], folder: str = "invoice") -> Dict[str, str]:
+    if text_files:
+        texts = {}
+        for path in text_files:
+            with open(path, "r", encoding="utf-8") as f:
+                texts[os.path.basename(path)] = f.read()
+        return texts
+
+    texts = {}
+    for path in app.iter_input_files(folder):
+        if path.lower().endswith(".pdf"):
+            texts[os.path.basename(path)] = app.ocr_pdf_to_text(path)
+        else:
+            texts[os.path.basename(path)] = app.ocr_image_to_text(app.load_image(path))
+    return texts
+
+
+def timeit(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-3 seconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+# ================= HEADER ================= #
+
+def bench_header(texts: Dict[str, str], repeat: int) -> bool:
+    """extract_header(): per-field rx() on raw patterns vs the single-scan FieldEngine"""
+    registry = app.load_patterns("patterns.json", app.VENDOR_MASTER)
+    raw = registry.raw
+    identical = True
+
+    print(f"{'file':40} {'chars':>7} {'rx() ms':>9} {'engine ms':>10} {'speedup':>8}")
+    for name, text in texts.items():
+        vendor = app.detect_vendor(text, registry)
+        legacy = app.extract_header(text, vendor, raw)
+        engine = app.extract_header(text, vendor, registry)
+        if legacy != engine:
+            identical = False
+            diff = [k for k in legacy if legacy[k] != engine.get(k)]
+            print(f"  MISMATCH in {name}: {diff}")
+
+        t_legacy = timeit(lambda: app.extract_header(text, vendor, raw), repeat)
+        t_engine = timeit(lambda: app.extract_header(text, vendor, registry), repeat)
+        print(f"{name[:40]:40} {len(text):7d} {t_legacy * 1e3:9.3f} {t_engine * 1e3:10.3f} "
+              f"{t_legacy / t_engine:7.1f}x")
+
+    print("output identical" if identical else "OUTPUT DIFFERS")
+    return identical
+
+
+# ================= OCR ================= #
+
+def extract_fields(text: str, registry) -> Dict[str, object]:
+    vendor = app.detect_vendor(text, registry)
+    return {"header": app.extract_header(text, vendor, registry),
+            "items": app.extract_items(text, vendor, registry)}
+
+
+def bench_ocr(folder: str) -> bool:
+    """Scanned-page OCR at fixed OCR_DPI vs ADAPTIVE_DPI (probe + text regions only)"""
+    registry = app.load_patterns("patterns.json", app.VENDOR_MASTER)
+    saved = app.OCR_CACHE_DIR, app.ADAPTIVE_DPI, app._ocr_cache
+    app.OCR_CACHE_DIR, app._ocr_cache = None, None
+    identical = True
+
+    print(f"{'file':40} {'mode':9} {'seconds':>8} {'renders':>8} {'MPixels':>8} {'peak MB':>8}")
+    try:
+        for path in app.iter_input_files(folder):
+            if not path.lower().endswith(".pdf"):
+                continue
+            fields = {}
+            for adaptive in (False, True):
+                app.ADAPTIVE_DPI = adaptive
+                app.RENDER_STATS.clear()
+                start = time.perf_counter()
+                text = app.ocr_pdf_to_text(path)
+                seconds = time.perf_counter() - start
+                stats = app.RENDER_STATS
+                fields[adaptive] = extract_fields(text, registry)
+                print(f"{os.path.basename(path)[:40]:40} {'adaptive' if adaptive else 'fixed':9} "
+                      f"{seconds:8.2f} {stats['renders']:8d} {stats['pixels'] / 1e6:8.1f} "
+                      f"{stats['peak_bytes'] / 2 ** 20:8.1f}")
+            if fields[False] != fields[True]:
+                identical = False
+                header_diff = [k for k, v in fields[False]["header"].items() if fields[True]["header"].get(k) != v]
+                print(f"  FIELDS DIFFER: header {header_diff}, "
+                      f"items {len(fields[False]['items'])} vs {len(fields[True]['items'])}")
+    finally:
+        app.OCR_CACHE_DIR, app.ADAPTIVE_DPI, app._ocr_cache = saved
+
+    print("fields identical" if identical else "FIELDS DIFFER")
+    return identical
+
+
+# ================= RENDER ================= #
+
+def render_child(folder: str, grayscale: bool) -> None:
+    """Runs in a fresh interpreter: OCR every PDF once, print timings and RSS as JSON"""
+    import resource
+
+    app.OCR_CACHE_DIR, app._ocr_cache = None, None
+    app.OCR_GRAYSCALE = grayscale
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for path in app.iter_input_files(folder):
+        if path.lower().endswith(".pdf"):
+            app.ocr_pdf_to_text(path)
+    print(json.dumps({
+        "seconds": time.perf_counter() - start,
+        "base_kb": base,
+        "peak_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "renders": app.RENDER_STATS["renders"],
+        "peak_bytes": app.RENDER_STATS["peak_bytes"],
+    }))
+
+
+def bench_render(folder: str) -> bool:
+    """RGB frombytes copy vs grayscale pixmap view, peak RSS measured per subprocess"""
+    print(f"{'mode':12} {'seconds':>8} {'renders':>8} {'pixmap MB':>10} {'RSS MB':>8} {'+RSS MB':>8}")
+    for mode in ("rgb", "gray"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "render", "--folder", folder, "--child", mode],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:12} {r['seconds']:8.2f} {r['renders']:8d} {r['peak_bytes'] / 2 ** 20:10.1f} "
+              f"{r['peak_kb'] / 1024:8.1f} {(r['peak_kb'] - r['base_kb']) / 1024:8.1f}")
+    return True
+
+
+# ================= PREPROCESS ================= #
+
+def pil_lambda_chain(img):
+    """The chain from compare_preprocessing.py, per-pixel lambda threshold included"""
+    from PIL import ImageOps, ImageFilter
+    img = ImageOps.grayscale(img)
+    img = ImageOps.autocontrast(img)
+    img = img.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=3))
+    return img.point(lambda x: 0 if x < 160 else 255, mode="1")
+
+
+def bench_preprocess(folder: str) -> bool:
+    """Per profile: preprocessing time, PNG size handed to tesseract, OCR time and text length"""
+    import io
+    import fitz
+
+    backend = app.get_ocr_backend()
+    steps = [("pil-lambda", pil_lambda_chain)] + [
+        (name, lambda img, name=name: app.preprocess.apply(img, name)) for name in app.preprocess.PROFILES
+    ]
+
+    print(f"{'page':40} {'profile':11} {'prep ms':>8} {'PNG KB':>8} {'OCR s':>7} {'chars':>6}")
+    for path in app.iter_input_files(folder):
+        if not path.lower().endswith(".pdf"):
+            continue
+        with fitz.open(path) as doc:
+            for index, page in enumerate(doc):
+                if page.get_text().strip():
+                    continue  # text layer - never OCR'd
+                pix = page.get_pixmap(dpi=app.OCR_DPI, colorspace=fitz.csGRAY, alpha=False)
+                img = app.Image.frombytes("L", (pix.width, pix.height), pix.samples)
+                label = f"{os.path.basename(path)[:34]} p{index + 1}"
+                for name, step in steps:
+                    start = time.perf_counter()
+                    out = step(img)
+                    prep = time.perf_counter() - start
+                    buf = io.BytesIO()
+                    out.save(buf, format="PNG")
+                    start = time.perf_counter()
+                    text = backend.image_to_string(out, app.OCR_LANG, app.OCR_CONFIG)
+                    ocr = time.perf_counter() - start
+                    print(f"{label:40} {name:11} {prep * 1e3:8.1f} {buf.tell() / 1024:8.0f} "
+                          f"{ocr:7.2f} {len(text.strip()):6d}")
+    return True
+
+
+# ================= POST PROCESS ================= #
+
+def build_rows(texts: Dict[str, str], count: int) -> List[Dict[str, Any]]:
+    """`count` extracted (not yet post-processed) rows cycled from the texts, amounts varied"""
+    registry = app.load_patterns("patterns.json", app.VENDOR_MASTER)
+    base = []
+    for name, text in texts.items():
+        vendor = app.detect_vendor(text, registry)
+        header = app.extract_header(text, vendor, registry)
+        items = app.extract_items(text, vendor, registry) or [{}]
+        base.extend({**header, **item, "file_name": name} for item in items)
+
+    rng = random.Random(0)
+    rows = []
+    for i in range(count):
+        row = dict(base[i % len(base)])
+        if row.get("amount"):
+            row["amount"] = f"{rng.uniform(10, 100000):,.2f}"
+            row["quantity"] = str(rng.randint(1, 500))
+        row["file_name"] = f"{i // len(base):06d}_{row['file_name']}"
+        rows.append(row)
+    return rows
+
+
+def bench_postprocess(texts: Dict[str, str], count: int) -> bool:
+    """post_process() throughput on `count` rows"""
+    rows = build_rows(texts, count)
+    checks, seconds = timed(lambda: app.post_process(rows))
+    print(f"{'rows':>8} {'seconds':>8} {'rows/s':>10} {'checks':>7}")
+    print(f"{count:8d} {seconds:8.3f} {count / seconds:10.0f} {len(checks):7d}")
+    return True
+
+
+# ================= RECORDS ================= #
+
+def bench_records(texts: Dict[str, str], count: int) -> bool:
+    """Memory of `count` extracted rows as flat dicts vs InvoiceHeader/InvoiceItem records"""
+    import pickle
+    import tracemalloc
+    from records import InvoiceHeader, InvoiceItem
+
+    registry = app.load_patterns("patterns.json", app.VENDOR_MASTER)
+    invoices = []
+    for name, text in texts.items():
+        vendor = app.detect_vendor(text, registry)
+        invoices.append((name, app.extract_header(text, vendor, registry),
+                         app.extract_items(text, vendor, registry) or [{}]))
+
+    def as_dicts():
+        rows = []
+        while len(rows) < count:
+            for name, header, items in invoices:
+                rows.extend({**header, **item, "file_name": name} for item in items)
+        return rows[:count]
+
+    def as_records():
+        rows = []
+        while len(rows) < count:
+            for name, header, items in invoices:
+                shared = InvoiceHeader(header, name)
+                rows.extend(InvoiceItem(shared, item) for item in items)
+        return rows[:count]
+
+    print(f"{'form':10} {'rows':>8} {'MB':>8} {'B/row':>7} {'pickled MB':>11} {'seconds':>8}")
+    built = {}
+    for form, build in (("dicts", as_dicts), ("records", as_records)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        rows = build()
+        seconds = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        pickled = len(pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL))
+        built[form] = rows
+        print(f"{form:10} {count:8d} {size / 1e6:8.1f} {size / count:7.0f} {pickled / 1e6:11.1f} {seconds:8.3f}")
+
+    identical = built["dicts"] == [r.to_row() for r in built["records"]] and \
+        all(list(a) == list(b.to_row()) for a, b in zip(built["dicts"], built["records"]))
+    print("rows identical" if identical else "ROWS DIFFER")
+    return identical
+
+
+# ================= SUITE ================= #
+
+SUITE_STAGES = ["render", "ocr", "detect_vendor", "extract_header", "extract_items",
+                "post_process", "excel", "columnar", "pipeline"]
+BASELINE = os.path.join("benchmarks", "baseline.json")
+# Differences below these are never reported as regressions
+NOISE_MS = 0.5
+NOISE_SECONDS = 0.1
+
+
+def peak_rss_mb(who: str = "self") -> float:
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF)
+    return usage.ru_maxrss / 1024.0  # KiB on Linux
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+def build_corpus(folder: str, copies: int, pages: List[int], out_dir: str) -> List[str]:
+    """
+    Scaled corpus: every PDF under `folder` padded (by repeating its pages) to
+    each page count in `pages`, and every file `copies` times
+    """
+    import fitz
+
+    corpus = []
+    for path in app.iter_input_files(folder):
+        stem, ext = os.path.splitext(os.path.basename(path))
+        variants = []
+        if ext.lower() == ".pdf":
+            with fitz.open(path) as src:
+                for count in pages:
+                    target = os.path.join(out_dir, f"{stem} p{count}{ext}")
+                    with fitz.open() as doc:
+                        while doc.page_count < count:
+                            doc.insert_pdf(src, to_page=min(src.page_count, count - doc.page_count) - 1)
+                        doc.save(target)
+                    variants.append(target)
+        else:
+            target = os.path.join(out_dir, stem + ext)
+            shutil.copyfile(path, target)
+            variants.append(target)
+
+        for variant in variants:
+            corpus.append(variant)
+            base, ext = os.path.splitext(variant)
+            for i in range(1, copies):
+                copy = f"{base} c{i}{ext}"
+                shutil.copyfile(variant, copy)
+                corpus.append(copy)
+    return corpus
+
+
+def stage_result(stage: str, unit: str, latencies: List[float], items: int = None,
+                 wall: float = None, rss: str = "self") -> Dict[str, Any]:
+    wall = sum(latencies) if wall is None else wall
+    items = len(latencies) if items is None else items
+    return {
+        "stage": stage, "unit": unit, "n": items,
+        "seconds": round(wall, 4),
+        "throughput": round(items / wall, 3) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1e3, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1e3, 3),
+        "peak_rss_mb": round(peak_rss_mb(rss), 1),
+    }
+
+
+def timed(fn: Callable[[], Any]):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_suite(paths: List[str], stages: List[str], workers: int) -> List[Dict[str, Any]]:
+    import fitz
+
+    registry = app.load_patterns("patterns.json", app.VENDOR_MASTER)
+    pdfs = [p for p in paths if p.lower().endswith(".pdf")]
+    results = []
+
+    def read(path: str) -> str:
+        if path.lower().endswith(".pdf"):
+            return app.ocr_pdf_to_text(path)
+        return app.ocr_image_to_text(app.load_image(path))
+
+    if "render" in stages:
+        latencies = []
+        for path in pdfs:
+            with fitz.open(path) as doc:
+                for page in doc:
+                    if page.get_text().strip():
+                        continue  # text layer - never rendered
+                    _, seconds = timed(lambda: page.get_pixmap(dpi=app.OCR_DPI, colorspace=fitz.csGRAY,
+                                                               alpha=False))
+                    latencies.append(seconds)
+        results.append(stage_result("render", "pages", latencies))
+
+    texts = {}
+    if "ocr" in stages:
+        latencies = []
+        for path in paths:
+            texts[path], seconds = timed(lambda: read(path))
+            latencies.append(seconds)
+        results.append(stage_result("ocr", "docs", latencies))
+    else:
+        # Later stages still need text - take it from the OCR cache, untimed
+        saved = app.OCR_CACHE_DIR, app._ocr_cache
+        app.OCR_CACHE_DIR, app._ocr_cache = ".ocr_cache", None
+        try:
+            texts = {path: read(path) for path in paths}
+        finally:
+            app.OCR_CACHE_DIR, app._ocr_cache = saved
+
+    vendors, headers, items = {}, {}, {}
+    for stage, fn, out in (
+        ("detect_vendor", lambda p: app.detect_vendor(texts[p], registry), vendors),
+        ("extract_header", lambda p: app.extract_header(texts[p], vendors[p], registry), headers),
+        ("extract_items", lambda p: app.extract_items(texts[p], vendors[p], registry), items),
+    ):
+        latencies = []
+        for path in paths:
+            out[path], seconds = timed(lambda: fn(path))
+            latencies.append(seconds)
+        if stage in stages:
+            results.append(stage_result(stage, "docs", latencies))
+
+    rows = {path: [{**headers[path], **item, "file_name": os.path.basename(path)} for item in items[path]]
+            or [{**headers[path], "file_name": os.path.basename(path)}] for path in paths}
+    if "post_process" in stages:
+        latencies = [timed(lambda: app.post_process(rows[path]))[1] for path in paths]
+        results.append(stage_result("post_process", "docs", latencies))
+
+    if "excel" in stages:
+        with tempfile.TemporaryDirectory() as tmp:
+            ndjson = os.path.join(tmp, "rows.ndjson")
+            with app.NDJSONWriter(ndjson) as writer:
+                for path in paths:
+                    writer.write(rows[path])
+            latencies = [timed(lambda: app.ndjson_to_excel(ndjson, os.path.join(tmp, "rows.xlsx")))[1]
+                         for _ in range(3)]
+        results.append(stage_result("excel", "rows", latencies, items=writer.rows * 3))
+
+    if "columnar" in stages and app.outputs.pa is not None:
+        with tempfile.TemporaryDirectory() as tmp:
+            ndjson = os.path.join(tmp, "rows.ndjson")
+            with app.NDJSONWriter(ndjson) as writer:
+                for path in paths:
+                    writer.write(rows[path])
+            latencies = [timed(lambda: app.outputs.ndjson_to_columnar(ndjson, os.path.join(tmp, "rows.parquet")))[1]
+                         for _ in range(3)]
+        results.append(stage_result("columnar", "rows", latencies, items=writer.rows * 3))
+
+    if "pipeline" in stages:
+        latencies = []
+        start = time.perf_counter()
+        for result in app.process_files(paths, registry, workers=workers):
+            app.post_process(app.materialize(result.rows))
+            latencies.append(result.seconds)
+        wall = time.perf_counter() - start
+        # Workers are only counted in RUSAGE_CHILDREN once they have been reaped
+        deadline = time.time() + 10
+        while multiprocessing.active_children() and time.time() < deadline:
+            time.sleep(0.05)
+        results.append(stage_result("pipeline", "docs", latencies, wall=wall,
+                                    rss="children" if workers > 1 else "self"))
+    return results
+
+
+def compare_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stages whose p50 or throughput got worse than the baseline by more than `tolerance`"""
+    previous = {r["stage"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        old = previous.get(r["stage"])
+        if not old:
+            continue
+        if r["p50_ms"] > old["p50_ms"] * (1 + tolerance) and r["p50_ms"] - old["p50_ms"] > NOISE_MS:
+            regressions.append(f"{r['stage']}: p50 {old['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms")
+        # Sub-second totals are mostly timer noise
+        if old["throughput"] and r["seconds"] >= NOISE_SECONDS \
+                and r["throughput"] < old["throughput"] / (1 + tolerance):
+            regressions.append(f"{r['stage']}: throughput {old['throughput']:.2f} -> "
+                               f"{r['throughput']:.2f} {r['unit']}/s")
+    return regressions
+
+
+def bench_suite(args) -> bool:
+    corpus = {"folder": args.folder, "copies": args.copies, "pages": args.pages, "workers": args.workers}
+    if args.synthetic:
+        corpus["synthetic"] = [args.synthetic, args.synthetic_scanned]
+    saved = app.OCR_CACHE_DIR, app._ocr_cache
+    app.OCR_CACHE_DIR, app._ocr_cache = None, None
+    tmp = tempfile.mkdtemp(prefix="invoice_bench_")
+    try:
+        paths = build_corpus(args.folder, args.copies, args.pages, tmp)
+        if args.synthetic:
+            import synth_invoices
+            paths += synth_invoices.generate(os.path.join(tmp, "synthetic"), args.synthetic,
+                                             scanned=args.synthetic_scanned)
+        corpus["files"] = len(paths)
+        print(f"corpus: {len(paths)} file(s) from {args.folder} (copies={args.copies}, pages={args.pages}, "
+              f"synthetic={args.synthetic})")
+        results = run_suite(paths, args.stages, args.workers)
+    finally:
+        app.OCR_CACHE_DIR, app._ocr_cache = saved
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{'stage':15} {'n':>6} {'unit':5} {'seconds':>8} {'per s':>9} {'p50 ms':>9} {'p95 ms':>9} {'RSS MB':>8}")
+    for r in results:
+        print(f"{r['stage']:15} {r['n']:6d} {r['unit']:5} {r['seconds']:8.3f} {r['throughput']:9.2f} "
+              f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['peak_rss_mb']:8.1f}")
+
+    report = {"corpus": corpus, "python": platform.python_version(), "machine": platform.machine(),
+              "results": results}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return True
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline} (run with --save-baseline)")
+        return True
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != corpus:
+        print(f"baseline corpus {baseline.get('corpus')} differs - not compared")
+        return True
+    regressions = compare_baseline(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"  REGRESSION {line}")
+    print("no regressions" if not regressions else f"{len(regressions)} regression(s) vs {args.baseline}")
+    return not regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("stage", choices=["header", "ocr", "render", "preprocess", "postprocess", "records", "suite"])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--text", nargs="*", default=[], help="OCR text files to use instead of invoice/")
+    parser.add_argument("--folder", default="invoice", help="PDFs for the ocr/render/preprocess stages")
+    parser.add_argument("--child", choices=["rgb", "gray"], help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, default=100000, help="postprocess/records: rows to build")
+    parser.add_argument("--copies", type=int, default=1, help="suite: copies of every document")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1], help="suite: page counts to pad PDFs to")
+    parser.add_argument("--workers", type=int, default=app.WORKERS, help="suite: pipeline worker processes")
+    parser.add_argument("--synthetic", type=int, default=0, help="suite: generated invoices to add")
+    parser.add_argument("--synthetic-scanned", type=float, default=0.0,
+                        help="suite: fraction of the generated invoices rendered as scans")
+    parser.add_argument("--stages", nargs="+", choices=SUITE_STAGES, default=SUITE_STAGES)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="suite: allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    if args.stage == "suite":
+        return 0 if bench_suite(args) else 1
+
+    if args.stage == "preprocess":
+        return 0 if bench_preprocess(args.folder) else 1
+    if args.stage == "render":
+        if args.child:
+            render_child(args.folder, args.child == "gray")
+            return 0
+        return 0 if bench_render(args.folder) else 1
+
+    if args.stage == "ocr":
+        return 0 if bench_ocr(args.folder) else 1
+
+    texts = load_texts(args.text)
+    if not texts:
+        print("no input texts")
+        return 1
+
+    if args.stage == "postprocess":
+        return 0 if bench_postprocess(texts, args.rows) else 1
+    if args.stage == "records":
+        return 0 if bench_records(texts, args.rows) else 1
+
+    ok = bench_header(texts, args.repeat)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
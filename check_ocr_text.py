@@ -1,7 +1,8 @@
-import pytesseract
 from PIL import Image, ImageOps, ImageFilter
 import fitz
 
+from app import ocr_image_to_text  # shares the persistent OCR cache
+
 def preprocess_image(img):
     img = ImageOps.grayscale(img)
     img = ImageOps.autocontrast(img)
@@ -14,7 +15,7 @@ page = doc[0]
 pix = page.get_pixmap(dpi=300)
 img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
 img = preprocess_image(img)
-text = pytesseract.image_to_string(img, lang="eng", config="--psm 6")
+text = ocr_image_to_text(img, config="--psm 6")
 
 # Print first 30 lines
 lines = text.split('\n')
@@ -10,6 +10,8 @@ import pytesseract
 from PIL import Image
 import fitz
 
+from app import ocr_image_to_text  # shares the persistent OCR cache
+
 # Load patterns
 with open("patterns.json", "r", encoding="utf-8") as f:
     patterns = json.load(f)
@@ -50,7 +52,7 @@ def ocr_pdf_to_text(path: str) -> str:
         else:
             pix = page.get_pixmap(dpi=300)
             img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            pages.append(pytesseract.image_to_string(img, lang="eng"))
+            pages.append(ocr_image_to_text(img, config=""))
     doc.close()
     return "\n".join(pages)
 
@@ -0,0 +1,104 @@
+# File - manifest.py
+"""
+Run manifest for resumable batches.
+
+Every processed file is recorded with its size, mtime and content hash,
+the fingerprint it was extracted with (patterns.json, vendors.json and the
+OCR settings - see app.run_fingerprint), its status, row count, timing and
+the post-processed rows themselves. On the next run a file whose entry is
+"ok" and still matches (same size and mtime, or same content hash after a
+touch, and same fingerprint) is skipped and its stored rows are reused;
+failed, changed and new files are processed again.
+"""
+import os
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ocr_cache import file_digest
+
+
+def file_signature(path: str) -> Tuple[int, int, str]:
+    """(size, mtime_ns, sha256) of a file, or (-1, -1, "") if it can't be read"""
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns, file_digest(path)
+    except OSError:
+        return -1, -1, ""
+
+
+class RunManifest:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " sha256 TEXT NOT NULL, patterns TEXT NOT NULL, status TEXT NOT NULL,"
+            " row_count INTEGER NOT NULL, seconds REAL NOT NULL, error TEXT NOT NULL,"
+            " rows TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def is_done(self, path: str, patterns: str) -> bool:
+        """True if `path` completed earlier and neither it nor the `patterns` fingerprint changed since"""
+        entry = self._db.execute(
+            "SELECT size, mtime_ns, sha256, patterns, status FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if entry is None:
+            return False
+        size, mtime_ns, sha, entry_patterns, status = entry
+        if status != "ok" or entry_patterns != patterns:
+            return False
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime_ns:
+            return True
+
+        # Touched but maybe not modified - compare content
+        if file_digest(path) != sha:
+            return False
+        with self._db:
+            self._db.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (st.st_mtime_ns, path))
+        return True
+
+    def rows(self, path: str) -> List[Dict[str, Any]]:
+        entry = self._db.execute("SELECT rows FROM files WHERE path = ?", (path,)).fetchone()
+        return json.loads(entry[0]) if entry else []
+
+    def record(self, path: str, patterns: str, rows: List[Dict[str, Any]],
+               seconds: float, error: str = "", signature: Tuple[int, int, str] = None) -> None:
+        """
+        Store the rows extracted from `path`. `signature` is its file_signature()
+        from before it was read, so a file rewritten while it was processed
+        doesn't match its entry; without one the file is looked at now.
+        """
+        size, mtime_ns, sha = signature or file_signature(path)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, sha, patterns, "failed" if error else "ok",
+                 len(rows), seconds, error, json.dumps(rows), time.time()),
+            )
+
+    def summary(self) -> Dict[str, int]:
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+
+    def entry(self, path: str) -> Optional[Dict[str, Any]]:
+        cur = self._db.execute(
+            "SELECT path, size, mtime_ns, sha256, status, row_count, seconds, error, updated "
+            "FROM files WHERE path = ?", (path,)
+        )
+        row = cur.fetchone()
+        return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,129 @@
+# File - metrics.py
+"""
+Per-stage timing for the OCR/extraction pipeline.
+
+    with METRICS.stage("render", page=3) as m:
+        pix = page.get_pixmap(...)
+        m["bytes"] = pix.stride * pix.height
+
+records wall time, CPU time and a byte count for the stage. Every stage is
+aggregated by name, and also logged as an event of the current file (with
+its page) so a per-file trace can be written. CPU time is the calling
+thread's CPU plus that of child processes that finished meanwhile (the
+tesseract CLI), so it is approximate when pages are OCR'd concurrently.
+
+The collector is per process: batch workers send to_dict() back with their
+FileResult and main() merge()s them.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+
+def _cpu() -> float:
+    t = os.times()
+    return time.thread_time() + t.children_user + t.children_system
+
+
+class Metrics:
+    def __init__(self):
+        # stage -> [calls, wall_s, cpu_s, bytes, max_wall_s]
+        self.stages: Dict[str, List[float]] = {}
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, page: int = None, nbytes: int = 0) -> Iterator[Dict[str, Any]]:
+        info = {"bytes": nbytes}
+        wall, cpu = time.perf_counter(), _cpu()
+        try:
+            yield info
+        finally:
+            self.record(name, time.perf_counter() - wall, _cpu() - cpu, info["bytes"], page)
+
+    def record(self, name: str, wall: float, cpu: float, nbytes: int = 0, page: int = None) -> None:
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = [0, 0.0, 0.0, 0, 0.0]
+            entry[0] += 1
+            entry[1] += wall
+            entry[2] += cpu
+            entry[3] += nbytes
+            entry[4] = max(entry[4], wall)
+            event = {"stage": name, "wall": round(wall, 6), "cpu": round(cpu, 6), "bytes": nbytes}
+            if page is not None:
+                event["page"] = page
+            self.events.append(event)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self.events.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Picklable/JSON form, also what merge() accepts"""
+        with self._lock:
+            return {
+                "stages": [[name, *entry] for name, entry in self.stages.items()],
+                "events": list(self.events),
+            }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Add another collector's totals (its events are left to the trace log)"""
+        with self._lock:
+            for name, calls, wall, cpu, nbytes, peak in data.get("stages", []):
+                entry = self.stages.get(name)
+                if entry is None:
+                    entry = self.stages[name] = [0, 0.0, 0.0, 0, 0.0]
+                entry[0] += calls
+                entry[1] += wall
+                entry[2] += cpu
+                entry[3] += nbytes
+                entry[4] = max(entry[4], peak)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Stages ranked by total wall time"""
+        ranked = sorted(self.stages.items(), key=lambda kv: kv[1][1], reverse=True)
+        return [
+            {
+                "stage": name, "calls": int(calls), "wall_s": round(wall, 4), "cpu_s": round(cpu, 4),
+                "bytes": int(nbytes), "mean_ms": round(wall / calls * 1e3, 3) if calls else 0.0,
+                "max_ms": round(peak * 1e3, 3),
+            }
+            for name, (calls, wall, cpu, nbytes, peak) in ranked
+        ]
+
+    def report(self) -> str:
+        lines = [f"{'stage':16} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'mean ms':>9} {'max ms':>9} {'MB':>9}"]
+        for r in self.summary():
+            lines.append(f"{r['stage'][:16]:16} {r['calls']:6d} {r['wall_s']:9.3f} {r['cpu_s']:9.3f} "
+                         f"{r['mean_ms']:9.2f} {r['max_ms']:9.2f} {r['bytes'] / 2 ** 20:9.2f}")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix: str = "invoice", extra: Dict[str, float] = None) -> str:
+        """Prometheus text exposition format"""
+        metrics = [
+            ("stage_calls_total", "Stage executions", 0),
+            ("stage_seconds_total", "Wall time spent in the stage", 1),
+            ("stage_cpu_seconds_total", "CPU time spent in the stage", 2),
+            ("stage_bytes_total", "Bytes handled by the stage", 3),
+            ("stage_max_seconds", "Longest single execution of the stage", 4),
+        ]
+        lines = []
+        for name, help_text, index in metrics:
+            kind = "gauge" if name.endswith("max_seconds") else "counter"
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for stage, entry in sorted(self.stages.items()):
+                lines.append(f'{prefix}_{name}{{stage="{stage}"}} {entry[index]:g}')
+        for name, value in (extra or {}).items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Collected by every stage() in this process
+METRICS = Metrics()
@@ -0,0 +1,208 @@
+# File - money.py
+"""
+Fixed-point money for the GST calculations.
+
+Amounts are parsed once into integer paise and every split is integer
+arithmetic with one defined rounding step, so the parts always add back up
+to the whole:
+
+    taxable = amount * 100 / (100 + rate), rounded half-up to the paisa
+    gst     = amount - taxable
+    CGST    = gst / 2, rounded half-up (CGST takes the odd paisa)
+    SGST    = gst - CGST                   (IGST = gst for inter-state)
+
+Half-up is away from zero, as in to_paise(): a negative amount (a credit
+note) splits into exactly the negated parts of the positive one.
+
+gst_split_batch() does the same over numpy arrays. InvoiceTotals sums the
+rows of each invoice as they are post-processed and reports where they
+disagree with the totals printed on the invoice; check_totals_batch() is the
+same check over per-invoice arrays.
+"""
+import math
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Larger amounts are OCR noise - and more than the typed output's
+# decimal128(18, 2) holds (outputs.parse_decimal); to_paise() treats them as unparseable
+MAX_PAISE = 10 ** 18 - 1
+
+# gst_split_batch() does int64 arithmetic on amounts below this (2 * amount * 10000
+# must fit), and rates below BATCH_MAX_RATE; other rows go through gst_split()
+BATCH_MAX_PAISE = 2 ** 62 // 10000 - 2 ** 30
+BATCH_MAX_RATE = 2 ** 30
+
+# Grand totals are printed rounded to the rupee ("Round Off"); a difference up
+# to this many paise is that rounding, not an error
+ROUND_OFF_PAISE = 50
+
+# Row field -> the invoice total it should add up to
+TOTAL_FIELDS = {
+    "taxable": "taxable_total",
+    "cgst_amount": "cgst_total_amount",
+    "sgst_amount": "sgst_total_amount",
+    "igst_amount": "igst_total_amount",
+    "amount": "grand_total",
+}
+
+
+def to_paise(value: Any) -> int:
+    """"1,234.5" -> 123450; blank, unparseable or past MAX_PAISE -> 0 (like clean_number)"""
+    if not value:
+        return 0
+    text = str(value).replace(",", "").replace(" ", "").strip()
+    if not text:
+        return 0
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return 0
+    if not number.is_finite() or abs(number) >= (MAX_PAISE + 1) // 100:
+        return 0
+    paise = int((number * 100).to_integral_value(ROUND_HALF_UP))
+    return paise if abs(paise) <= MAX_PAISE else 0
+
+
+def format_paise(paise: int) -> str:
+    """123450 -> "1234.50" """
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(int(paise)), 100)
+    return f"{sign}{rupees}.{rest:02d}"
+
+
+def format_paise_batch(paise: np.ndarray) -> List[str]:
+    """format_paise() over an int64 array"""
+    paise = np.asarray(paise, dtype=np.int64)
+    rupees, rest = np.divmod(np.abs(paise), 100)
+    signs = np.where(paise < 0, "-", "")
+    return [f"{sign}{r}.{p:02d}" for sign, r, p in zip(signs.tolist(), rupees.tolist(), rest.tolist())]
+
+
+def rate_hundredths(value: Any) -> int:
+    """GST rate "18" / "12.5" -> 1800 / 1250 (hundredths of a percent); raises ValueError like float()"""
+    rate = float(value or 0)
+    return round(rate * 100) if math.isfinite(rate) else 0
+
+
+def gst_split(amount: int, rate: int, inter: bool = False) -> Tuple[int, int, int]:
+    """(cgst, sgst, igst) paise in a GST-inclusive `amount` (paise) at `rate` (hundredths of a percent)"""
+    sign = -1 if amount < 0 else 1
+    amount = abs(amount)
+    denominator = 10000 + rate
+    taxable = (2 * amount * 10000 + denominator) // (2 * denominator)
+    gst = amount - taxable
+    if inter:
+        return 0, 0, sign * gst
+    cgst = (gst + 1) // 2
+    return sign * cgst, sign * (gst - cgst), 0
+
+
+def gst_split_batch(amounts: np.ndarray, rates: np.ndarray,
+                    inter: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """gst_split() over int64 arrays of amounts and rates and a boolean inter-state mask"""
+    amounts = np.asarray(amounts, dtype=np.int64)
+    rates = np.asarray(rates, dtype=np.int64)
+    inter = np.asarray(inter, dtype=bool)
+    wide = (np.abs(amounts) >= BATCH_MAX_PAISE) | (amounts == np.iinfo(np.int64).min) \
+        | (np.abs(rates) >= BATCH_MAX_RATE)
+    if wide.any():
+        # Would overflow int64: those rows in Python ints, the rest as arrays
+        parts = [np.empty(len(amounts), dtype=np.int64) for _ in range(3)]
+        narrow = ~wide
+        for part, values in zip(parts, gst_split_batch(amounts[narrow], rates[narrow], inter[narrow])):
+            part[narrow] = values
+        for i in np.flatnonzero(wide).tolist():
+            for part, value in zip(parts, gst_split(int(amounts[i]), int(rates[i]), bool(inter[i]))):
+                part[i] = value
+        return tuple(parts)
+    sign = np.where(amounts < 0, -1, 1)
+    amounts = np.abs(amounts)
+    denominator = 10000 + rates
+    taxable = (2 * amounts * 10000 + denominator) // (2 * denominator)
+    gst = amounts - taxable
+    cgst = np.where(inter, 0, sign * ((gst + 1) // 2))
+    gst = sign * gst
+    sgst = np.where(inter, 0, gst - cgst)
+    igst = np.where(inter, gst, 0)
+    return cgst, sgst, igst
+
+
+# ================= INVOICE TOTALS ================= #
+
+class InvoiceTotals:
+    """
+    Per-invoice sums of the post-processed rows, checked against the totals
+    on the invoice. add() takes each row once with its amounts already in
+    paise, so the check needs no extra pass over the rows.
+    """
+
+    def __init__(self):
+        # (file_name, invoice_number) -> [stated totals, summed rows], in order of first row
+        self.invoices: Dict[Tuple[str, str], List[Dict[str, int]]] = {}
+
+    def add(self, row: Dict[str, Any], amount: int, cgst: int, sgst: int, igst: int) -> None:
+        key = (row.get("file_name", ""), row.get("invoice_number", ""))
+        entry = self.invoices.get(key)
+        if entry is None:
+            # Header fields repeat on every row of an invoice; the first row's are used
+            stated = {field: to_paise(row.get(total)) for field, total in TOTAL_FIELDS.items()
+                      if row.get(total)}
+            entry = self.invoices[key] = [stated, dict.fromkeys(TOTAL_FIELDS, 0)]
+        summed = entry[1]
+        summed["taxable"] += amount - cgst - sgst - igst
+        summed["cgst_amount"] += cgst
+        summed["sgst_amount"] += sgst
+        summed["igst_amount"] += igst
+        summed["amount"] += amount
+
+    def checks(self) -> List[Dict[str, str]]:
+        """One entry per stated total the rows don't add up to"""
+        return check_totals(
+            ((key, stated, summed) for key, (stated, summed) in self.invoices.items())
+        )
+
+
+def check_totals(invoices) -> List[Dict[str, str]]:
+    """Mismatches for ((file_name, invoice_number), stated, summed) triples of paise dicts"""
+    checks = []
+    for (file_name, invoice_number), stated, summed in invoices:
+        for field, total in TOTAL_FIELDS.items():
+            if field not in stated:
+                continue
+            difference = summed[field] - stated[field]
+            tolerance = ROUND_OFF_PAISE if total == "grand_total" else 0
+            if abs(difference) > tolerance:
+                checks.append({"file_name": file_name, "invoice_number": invoice_number,
+                               "field": total, "stated": format_paise(stated[field]),
+                               "computed": format_paise(summed[field]),
+                               "difference": format_paise(difference)})
+    return checks
+
+
+def check_totals_batch(keys: List[Tuple[str, str]], stated: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                       sums: Dict[str, np.ndarray]) -> List[Dict[str, str]]:
+    """
+    check_totals() over arrays with one entry per invoice: `keys` are the
+    (file_name, invoice_number) pairs, `stated` maps each TOTAL_FIELDS field to
+    (printed on the invoice mask, paise) and `sums` to the summed paise.
+    """
+    invoice, field, found, computed = [], [], [], []
+    for f, (name, total) in enumerate(TOTAL_FIELDS.items()):
+        given, values = stated[name]
+        tolerance = ROUND_OFF_PAISE if total == "grand_total" else 0
+        hit = np.flatnonzero(given & (np.abs(sums[name] - values) > tolerance))
+        invoice.append(hit)
+        field.append(np.full(len(hit), f))
+        found.append(values[hit])
+        computed.append(sums[name][hit])
+    invoice, field = np.concatenate(invoice), np.concatenate(field)
+    order = np.lexsort((field, invoice))
+    invoice, field = invoice[order].tolist(), field[order].tolist()
+    found, computed = np.concatenate(found)[order], np.concatenate(computed)[order]
+    totals = list(TOTAL_FIELDS.values())
+    return [{"file_name": keys[i][0], "invoice_number": keys[i][1], "field": totals[f],
+             "stated": s, "computed": c, "difference": d}
+            for i, f, s, c, d in zip(invoice, field, format_paise_batch(found), format_paise_batch(computed),
+                                     format_paise_batch(computed - found))]
@@ -0,0 +1,136 @@
+# File - ocr_backend.py
+"""
+OCR engines behind app._tesseract().
+
+pytesseract starts a new `tesseract` process per image, which reloads the
+language model and round-trips the image through a temp PNG. When
+tesserocr is installed, TesserocrBackend instead keeps long-lived
+Tesseract API handles (one per concurrent caller, reused across images and
+files for the life of the worker process) and hands them the raw pixels -
+one bytes copy per image, since SetImageBytes takes bytes, but no PNG
+encode and no subprocess. pytesseract remains the fallback and is used for configs
+tesserocr can't express.
+"""
+import shlex
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # optional
+    tesserocr = None
+
+# The tesseract CLI (and so pytesseract) ends every page with this
+PAGE_SEPARATOR = "\f"
+
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def image_to_string(self, img: Image.Image, lang: str, config: str) -> str:
+        return pytesseract.image_to_string(img, lang=lang, config=config)
+
+
+def parse_config(config: str) -> Optional[Tuple[Optional[int], Optional[int], Tuple[Tuple[str, str], ...]]]:
+    """(psm, oem, variables) for a tesseract CLI config string, None if it has anything else"""
+    psm = oem = None
+    variables = []
+    tokens = shlex.split(config or "")
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("--psm", "--oem", "-c") and i + 1 < len(tokens):
+            value = tokens[i + 1]
+            i += 2
+        elif token.startswith("-c") and len(token) > 2:
+            token, value = "-c", token[2:]
+            i += 1
+        else:
+            return None
+        if token == "--psm" and value.isdigit():
+            psm = int(value)
+        elif token == "--oem" and value.isdigit():
+            oem = int(value)
+        elif token == "-c" and "=" in value:
+            variables.append(tuple(value.split("=", 1)))
+        else:
+            return None
+    return psm, oem, tuple(variables)
+
+
+class TesserocrBackend:
+    """Pooled tesserocr.PyTessBaseAPI handles, keyed by (lang, psm, oem, variables)"""
+
+    name = "tesserocr"
+
+    def __init__(self):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self._idle: Dict[tuple, List["tesserocr.PyTessBaseAPI"]] = {}
+        self._lock = threading.Lock()
+        self._fallback = PytesseractBackend()
+
+    def _acquire(self, key: tuple) -> "tesserocr.PyTessBaseAPI":
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        lang, psm, oem, variables = key
+        kwargs = {"lang": lang}
+        if psm is not None:
+            kwargs["psm"] = psm
+        if oem is not None:
+            kwargs["oem"] = oem
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in variables:
+            api.SetVariable(name, value)
+        return api
+
+    def _release(self, key: tuple, api: "tesserocr.PyTessBaseAPI") -> None:
+        api.Clear()
+        with self._lock:
+            self._idle.setdefault(key, []).append(api)
+
+    def image_to_string(self, img: Image.Image, lang: str, config: str) -> str:
+        parsed = parse_config(config)
+        if parsed is None:
+            return self._fallback.image_to_string(img, lang, config)
+
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("L" if img.mode == "1" else "RGB")
+        channels = 1 if img.mode == "L" else 3
+        key = (lang,) + parsed
+        api = self._acquire(key)
+        try:
+            # SetImageBytes only accepts bytes: this is the one copy of the pixels
+            api.SetImageBytes(img.tobytes(), img.width, img.height, channels, img.width * channels)
+            text = api.GetUTF8Text()
+        finally:
+            self._release(key, api)
+        return text + PAGE_SEPARATOR
+
+    def close(self) -> None:
+        with self._lock:
+            for apis in self._idle.values():
+                for api in apis:
+                    api.End()
+            self._idle.clear()
+
+
+def engine_name(engine: str = "auto") -> str:
+    """The backend get_backend(engine) gives: 'tesserocr' or 'pytesseract'"""
+    if engine == "pytesseract" or (engine == "auto" and tesserocr is None):
+        return PytesseractBackend.name
+    if engine in ("auto", "tesserocr"):
+        return TesserocrBackend.name
+    raise ValueError(f"unknown OCR engine {engine!r}")
+
+
+def get_backend(engine: str = "auto"):
+    """'auto' (tesserocr when installed), 'tesserocr' or 'pytesseract'"""
+    if engine_name(engine) == PytesseractBackend.name:
+        return PytesseractBackend()
+    return TesserocrBackend()
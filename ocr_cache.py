@@ -0,0 +1,183 @@
+# File - ocr_cache.py
+"""
+Persistent on-disk cache for OCR output.
+
+Entries live in a single SQLite database and are keyed by a digest of the
+source content plus everything that influences the OCR output (page
+index, DPI, engine, language, config). When the database grows past `max_bytes`
+the least recently used entries are evicted; the entries' total size is
+kept as a running count, so no put() has to add them up. Hit/miss counts
+and access times are gathered in memory and written by flush() (once per
+file in batch workers, and before stats()), so lookups don't write. The
+counters add up across batch worker processes. The orientation/skew
+angles detected per image file are stored too (tiny, never evicted).
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+
+def make_key(*parts: Any) -> str:
+    """Stable cache key from any number of key parts"""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 of a file's content"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def buffer_digest(*buffers: Any) -> str:
+    """sha256 over raw buffers (bytes / memoryview) without copying them"""
+    h = hashlib.sha256()
+    for buf in buffers:
+        h.update(buf)
+    return h.hexdigest()
+
+
+class OCRCache:
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = os.path.join(directory, "ocr_cache.sqlite")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        # Not yet flushed: hit/miss counts and key -> last access time
+        self._counts: Counter = Counter()
+        self._accessed: Dict[str, float] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _db(self) -> sqlite3.Connection:
+        # Connections must not cross a fork - reopen in each worker process
+        if self._conn is None or self._pid != os.getpid():
+            # Counts gathered before a fork belong to the parent
+            self._counts.clear()
+            self._accessed.clear()
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL,"
+                " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS angles ("
+                " key TEXT PRIMARY KEY, orientation INTEGER NOT NULL, skew REAL NOT NULL)"
+            )
+            with conn:
+                # The running size total; a cache written before it existed is summed once
+                conn.execute("INSERT OR IGNORE INTO counters(name, value) "
+                             "SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _add(self, db: sqlite3.Connection, name: str, value: int) -> int:
+        """Add to a counter and return its new value"""
+        return db.execute(
+            "INSERT INTO counters(name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value RETURNING value",
+            (name, value),
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db().execute("SELECT text FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._counts["misses"] += 1
+                return None
+            self._counts["hits"] += 1
+            self._accessed[key] = time.time()
+            return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            db = self._db()
+            with db:
+                # Write-locked from the start, so the size replaced and the total agree
+                db.execute("BEGIN IMMEDIATE")
+                old = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries(key, text, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, text, size, time.time()),
+                )
+                self._accessed.pop(key, None)
+                total = self._add(db, "bytes", size - (old[0] if old else 0))
+                if total > self.max_bytes:
+                    self._write_pending(db)
+                    self._evict(db, total)
+
+    def flush(self) -> None:
+        """Write the hit/miss counts and access times gathered since the last flush"""
+        with self._lock:
+            if self._counts or self._accessed:
+                db = self._db()
+                with db:
+                    self._write_pending(db)
+
+    def _write_pending(self, db: sqlite3.Connection) -> None:
+        for name, value in self._counts.items():
+            self._add(db, name, value)
+        db.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                       [(accessed, key) for key, accessed in self._accessed.items()])
+        self._counts.clear()
+        self._accessed.clear()
+
+    def get_angle(self, key: str) -> Optional[Tuple[int, float]]:
+        """(orientation, skew) stored for an image file by put_angle()"""
+        with self._lock:
+            row = self._db().execute("SELECT orientation, skew FROM angles WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put_angle(self, key: str, orientation: int, skew: float) -> None:
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("INSERT OR REPLACE INTO angles(key, orientation, skew) VALUES (?, ?, ?)",
+                           (key, orientation, skew))
+
+    def _evict(self, db: sqlite3.Connection, total: int) -> None:
+        # Drop least recently used entries until we are back under 90% of the budget
+        target = self.max_bytes * 0.9
+        dropped = 0
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total - dropped <= target:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            dropped += size
+        self._add(db, "bytes", -dropped)
+
+    def stats(self) -> Dict[str, int]:
+        self.flush()
+        with self._lock:
+            db = self._db()
+            counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+            entries = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": entries,
+            "bytes": counters.get("bytes", 0),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            db = self._db()
+            with db:
+                db.execute("DELETE FROM entries")
+                db.execute("DELETE FROM counters")
+                db.execute("INSERT INTO counters(name, value) VALUES ('bytes', 0)")
+                db.execute("DELETE FROM angles")
+            self._counts.clear()
+            self._accessed.clear()
@@ -0,0 +1,113 @@
+# File - ocr_layout.py
+"""
+Page probing for adaptive OCR.
+
+A scanned page (or region of one) is rendered once at PROBE_DPI in
+grayscale. The horizontal ink projection of that probe gives the text
+lines: their median height decides the DPI the real render needs, and runs
+of lines separated by wide blank gaps become the regions that are OCR'd
+(header block, item table, totals ...). Margins and blank gaps are never
+rendered at full resolution.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+import fitz  # PyMuPDF
+
+PROBE_DPI = 100
+# Render DPI range and the text line height (ascender to descender) aimed for
+MIN_DPI = 150
+MAX_DPI = 300
+TARGET_LINE_PX = 32
+# Lines further apart than this many line heights start a new region
+REGION_GAP_LINES = 2.5
+# Padding around each region, in points
+REGION_PAD_PT = 6.0
+
+INK_LEVEL = 160       # gray value below which a pixel counts as ink
+ROW_INK_FRACTION = 0.01
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """(start, end) pairs of the True runs in a 1-D mask"""
+    edges = np.diff(np.concatenate(([0], mask.view(np.int8), [0])))
+    return np.stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)), axis=1)
+
+
+def _drop_vertical_rules(ink: np.ndarray, max_len: int) -> np.ndarray:
+    """Clear vertical strokes longer than max_len (table rules would join every row)"""
+    padded = np.zeros((ink.shape[0] + 2, ink.shape[1]), dtype=np.int8)
+    padded[1:-1] = ink
+    edges = np.diff(padded, axis=0).T
+    cols, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    long = (ends - starts) > max_len
+    for col, start, end in zip(cols[long], starts[long], ends[long]):
+        ink[start:end, col] = False
+    return ink
+
+
+def ink_mask(gray: np.ndarray, dpi: int = PROBE_DPI) -> np.ndarray:
+    ink = gray < INK_LEVEL
+    # Nothing textual on an invoice is taller than ~1/3 inch; longer strokes are rules
+    return _drop_vertical_rules(ink, max_len=dpi // 3)
+
+
+def text_lines(ink: np.ndarray) -> np.ndarray:
+    """Row runs that contain ink, ignoring speckle rows"""
+    rows = ink.sum(axis=1) > max(2, ink.shape[1] * ROW_INK_FRACTION)
+    lines = _runs(rows)
+    return lines[(lines[:, 1] - lines[:, 0]) >= 2]
+
+
+def choose_dpi(line_px: Optional[float], probe_dpi: int = PROBE_DPI) -> int:
+    """DPI at which a probed line height of line_px becomes TARGET_LINE_PX, rounded up to 25"""
+    if not line_px:
+        return MAX_DPI
+    dpi = TARGET_LINE_PX * probe_dpi / line_px
+    dpi = int(np.ceil(dpi / 25.0) * 25)
+    return max(MIN_DPI, min(MAX_DPI, dpi))
+
+
+def text_regions(ink: np.ndarray, lines: np.ndarray, line_px: float) -> List[Tuple[int, int, int, int]]:
+    """Group lines into blocks; (x0, y0, x1, y1) probe pixels of each block's ink"""
+    if not len(lines):
+        return []
+    gap = REGION_GAP_LINES * line_px
+    groups = [[lines[0][0], lines[0][1]]]
+    for start, end in lines[1:]:
+        if start - groups[-1][1] > gap:
+            groups.append([start, end])
+        else:
+            groups[-1][1] = end
+
+    regions = []
+    for y0, y1 in groups:
+        cols = np.flatnonzero(ink[y0:y1].any(axis=0))
+        if len(cols):
+            regions.append((int(cols[0]), int(y0), int(cols[-1]) + 1, int(y1)))
+    return regions
+
+
+def probe(page: "fitz.Page", clip: "fitz.Rect" = None) -> Tuple[int, List["fitz.Rect"]]:
+    """
+    Render `clip` (default the whole page) at PROBE_DPI and return the DPI to
+    OCR it at plus the text regions inside it, in page coordinates and
+    reading order. A blank page gives no regions.
+    """
+    clip = fitz.Rect(clip) if clip is not None else fitz.Rect(page.rect)
+    pix = page.get_pixmap(dpi=PROBE_DPI, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+    ink = ink_mask(gray)
+    lines = text_lines(ink)
+    line_px = float(np.median(lines[:, 1] - lines[:, 0])) if len(lines) else None
+    dpi = choose_dpi(line_px)
+
+    scale = 72.0 / PROBE_DPI
+    regions = []
+    for x0, y0, x1, y1 in text_regions(ink, lines, line_px or 0):
+        rect = fitz.Rect(clip.x0 + x0 * scale - REGION_PAD_PT, clip.y0 + y0 * scale - REGION_PAD_PT,
+                         clip.x0 + x1 * scale + REGION_PAD_PT, clip.y0 + y1 * scale + REGION_PAD_PT)
+        regions.append(rect & clip)
+    return dpi, regions
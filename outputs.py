@@ -0,0 +1,275 @@
+# File - outputs.py
+"""
+Result writers.
+
+Rows are streamed to an NDJSON file (one JSON object per line) as soon as
+each invoice has been post-processed, and flushed per invoice so a crash
+keeps everything written so far. result.json and result.xlsx are derived
+from that stream afterwards without loading it into memory.
+
+ColumnarWriter keeps a typed copy of the rows for large runs: Parquet (or
+Arrow IPC for a ".arrow" path) with decimal amounts, a date32 invoice_date
+and dictionary-encoded vendor/gst_rate/unit columns, written a row group at a
+time as invoices complete. It needs pyarrow.
+"""
+import json
+import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional
+    pa = pq = None
+
+
+class NDJSONWriter:
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.rows = 0
+        self._f = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._f.write(json.dumps(row))
+            self._f.write("\n")
+            self.rows += 1
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def ndjson_to_json(src: str, dst: str) -> int:
+    """
+    Write {"Data": [rows]} byte-for-byte as json.dump(..., indent=2) would,
+    one row at a time. Returns the number of rows.
+    """
+    count = 0
+    with open(dst, "w", encoding="utf-8") as out:
+        out.write('{\n  "Data": [')
+        for row in iter_ndjson(src):
+            body = json.dumps(row, indent=2).replace("\n", "\n    ")
+            out.write(("," if count else "") + "\n    " + body)
+            count += 1
+        out.write("\n  ]\n}" if count else "]\n}")
+    return count
+
+
+def ndjson_columns(src: str) -> List[str]:
+    """Union of row keys in order of first appearance (same as pd.DataFrame(rows).columns)"""
+    columns: Dict[str, None] = {}
+    for row in iter_ndjson(src):
+        for key in row:
+            if key not in columns:
+                columns[key] = None
+    return list(columns)
+
+
+def ndjson_to_excel(src: str, dst: str) -> int:
+    """Stream the NDJSON rows into a write-only openpyxl workbook. Returns the number of rows."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    columns = ndjson_columns(src)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+
+    header = []
+    for name in columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for row in iter_ndjson(src):
+        ws.append([row.get(name) for name in columns])
+        count += 1
+
+    wb.save(dst)
+    return count
+
+
+# ================= COLUMNAR ================= #
+
+# Declared schema: column -> kind. Row keys outside it stay in the NDJSON/JSON/Excel outputs only.
+ROW_COLUMNS = {
+    "vendor": "category",
+    "invoice_number": "text",
+    "invoice_date": "date",
+    "invoice_date_text": "text",
+    "supplier_name": "text",
+    "supplier_gstin": "text",
+    "supplier_pan": "text",
+    "supplier_address": "text",
+    "supplier_phone_no": "text",
+    "supplier_email": "text",
+    "account_holder_name": "text",
+    "account_number": "text",
+    "ifsc_code": "text",
+    "buyer_name": "text",
+    "buyer_gstin": "text",
+    "taxable_total": "amount",
+    "cgst_total_amount": "amount",
+    "sgst_total_amount": "amount",
+    "igst_total_amount": "amount",
+    "grand_total": "amount",
+    "item_name": "text",
+    "hsn_code": "text",
+    "quantity": "quantity",
+    "unit": "category",
+    "unit_price": "amount",
+    "amount": "amount",
+    "gst_rate": "category",
+    "HSN/SAC_type": "category",
+    "supply_type": "category",
+    "voucher_type": "category",
+    "cgst_amount": "amount",
+    "sgst_amount": "amount",
+    "igst_amount": "amount",
+    "file_name": "text",
+}
+
+# Amounts are rupees and paise; quantities may be fractional (kg, litres)
+AMOUNT_PLACES = Decimal("0.01")
+QUANTITY_PLACES = Decimal("0.001")
+# Digits in the decimal128 columns; a value that needs more is left empty
+DECIMAL_PRECISION = 18
+ROW_GROUP_ROWS = 65536
+
+# Invoice dates are day-first ("1-Apr-25", "08.03.24", "08/03/2024")
+DATE_FORMATS = (
+    "%d-%b-%y", "%d-%b-%Y", "%d-%B-%y", "%d-%B-%Y", "%d %b %Y", "%d %B %Y", "%d %b %y",
+    "%d.%m.%Y", "%d.%m.%y", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d-%m-%y", "%Y-%m-%d",
+)
+
+
+def parse_decimal(value: Any, places: Decimal = AMOUNT_PLACES,
+                  precision: int = DECIMAL_PRECISION) -> Optional[Decimal]:
+    """"1,234.5" -> Decimal("1234.50"); blank, unparseable or more than `precision` digits -> None"""
+    text = str(value if value is not None else "").replace(",", "").replace(" ", "").strip()
+    if not text:
+        return None
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return None
+    if not number.is_finite():
+        return None
+    try:
+        number = number.quantize(places, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        return None             # more digits than the decimal context holds
+    return number if len(number.as_tuple().digits) <= precision else None
+
+
+def parse_date(value: Any) -> Optional[datetime.date]:
+    text = " ".join(str(value or "").split())
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def row_schema() -> "pa.Schema":
+    types = {
+        "text": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "amount": pa.decimal128(DECIMAL_PRECISION, 2),
+        "quantity": pa.decimal128(DECIMAL_PRECISION, 3),
+        "date": pa.date32(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in ROW_COLUMNS.items()])
+
+
+def _column(kind: str, values: List[Any]) -> "pa.Array":
+    if kind == "amount":
+        return pa.array([parse_decimal(v) for v in values], type=pa.decimal128(DECIMAL_PRECISION, 2))
+    if kind == "quantity":
+        return pa.array([parse_decimal(v, QUANTITY_PLACES) for v in values], type=pa.decimal128(DECIMAL_PRECISION, 3))
+    if kind == "date":
+        return pa.array([parse_date(v) for v in values], type=pa.date32())
+    text = pa.array([None if v is None or v == "" else str(v) for v in values], type=pa.string())
+    if kind == "category":
+        return text.dictionary_encode()
+    return text
+
+
+class ColumnarWriter:
+    """
+    Typed rows to Parquet, or Arrow IPC for *.arrow / *.feather. Rows are
+    buffered per column and written as a row group every `row_group_rows`;
+    the file is only readable once close() has written the footer.
+    """
+
+    def __init__(self, path: str, row_group_rows: int = ROW_GROUP_ROWS):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        self.path = path
+        self.rows = 0
+        self.row_group_rows = row_group_rows
+        self.schema = row_schema()
+        self._buffer: Dict[str, List[Any]] = {name: [] for name in ROW_COLUMNS}
+        self._buffered = 0
+        if path.lower().endswith((".arrow", ".feather")):
+            self._sink = pa.ipc.new_file(path, self.schema)
+        else:
+            self._sink = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            for name, values in self._buffer.items():
+                # invoice_date_text keeps the date as printed, next to the parsed one
+                values.append(row.get("invoice_date" if name == "invoice_date_text" else name))
+            self._buffered += 1
+            self.rows += 1
+        if self._buffered >= self.row_group_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows as one row group (one record batch for Arrow IPC)"""
+        if not self._buffered:
+            return
+        arrays = [_column(ROW_COLUMNS[name], values) for name, values in self._buffer.items()]
+        self._sink.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        for values in self._buffer.values():
+            values.clear()
+        self._buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ndjson_to_columnar(src: str, dst: str, row_group_rows: int = ROW_GROUP_ROWS) -> int:
+    """Typed Parquet/Arrow copy of an NDJSON row stream. Returns the number of rows."""
+    with ColumnarWriter(dst, row_group_rows) as writer:
+        for row in iter_ndjson(src):
+            writer.write([row])
+    return writer.rows
@@ -0,0 +1,539 @@
+# File - pattern_registry.py
+"""
+patterns.json loaded and compiled once.
+
+A PatternRegistry behaves like the raw patterns dict (vendor -> config) but
+every regex is already compiled with the flags the extractors use:
+
+    field            -> tuple of compiled patterns, tried in order
+                        ("primary" then "fallback" for dict entries)
+    "item_patterns"  -> list of {"regex": compiled, "mapping": {...}}
+    "preprocess"     -> name of the image preprocessing profile (preprocess.py)
+
+Bad regexes are reported at load time with the vendor and field name.
+
+The registry also carries a VendorIndex that narrows vendor detection down
+to a handful of candidates with a single scan of the text, optionally a
+VendorMaster (vendors.json) that resolves the vendor from its GSTIN/PAN, and
+per-vendor FieldEngines that extract all header fields from one scan.
+"""
+import os
+import re
+import json
+import heapq
+import hashlib
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from regex_guard import run_guarded
+from preprocess import PROFILES as PREPROCESS_PROFILES
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover - older Pythons
+    import sre_parse
+    import sre_constants
+
+
+FIELD_FLAGS = re.I | re.S
+
+# Keys in a vendor config that are not header field regexes
+NON_FIELD_KEYS = {"item_patterns", "preprocess"}
+
+
+class PatternError(ValueError):
+    """Invalid entry in patterns.json"""
+
+
+def item_flags(vendor: str) -> int:
+    flags = re.I | re.M  # Use re.M for multiline matching
+    if vendor != "shine_traders":  # For other vendors, use re.S if needed
+        flags |= re.S
+    return flags
+
+
+def _compile(vendor: str, field: str, pattern: str, flags: int) -> re.Pattern:
+    if not isinstance(pattern, str):
+        raise PatternError(f"patterns.json: {vendor}.{field}: expected a regex string, got {type(pattern).__name__}")
+    try:
+        return re.compile(pattern, flags)
+    except re.error as e:
+        raise PatternError(f"patterns.json: {vendor}.{field}: invalid regex {pattern!r}: {e}") from None
+
+
+def _compile_field(vendor: str, field: str, value: Any) -> Tuple[re.Pattern, ...]:
+    if isinstance(value, dict):
+        return tuple(
+            _compile(vendor, f"{field}.{k}", value[k], FIELD_FLAGS)
+            for k in ("primary", "fallback") if value.get(k)
+        )
+    if not value:
+        return ()
+    return (_compile(vendor, field, value, FIELD_FLAGS),)
+
+
+def _compile_items(vendor: str, rules: Any) -> List[Dict[str, Any]]:
+    if not isinstance(rules, list):
+        raise PatternError(f"patterns.json: {vendor}.item_patterns: expected a list")
+
+    compiled = []
+    for i, rule in enumerate(rules):
+        where = f"item_patterns[{i}]"
+        if not isinstance(rule, dict) or "regex" not in rule or "mapping" not in rule:
+            raise PatternError(f"patterns.json: {vendor}.{where}: expected {{\"regex\", \"mapping\"}}")
+        regex = _compile(vendor, f"{where}.regex", rule["regex"], item_flags(vendor))
+        for key, group in rule["mapping"].items():
+            if isinstance(group, int) and not 0 <= group <= regex.groups:
+                raise PatternError(
+                    f"patterns.json: {vendor}.{where}.mapping.{key}: group {group} "
+                    f"does not exist (regex has {regex.groups})"
+                )
+        compiled.append({"regex": regex, "mapping": rule["mapping"]})
+    return compiled
+
+
+def _compile_vendor(vendor: str, cfg: Any) -> Dict[str, Any]:
+    if not isinstance(cfg, dict):
+        raise PatternError(f"patterns.json: {vendor}: expected an object")
+
+    compiled = {}
+    for field, value in cfg.items():
+        if field == "item_patterns":
+            compiled[field] = _compile_items(vendor, value)
+        elif field == "preprocess":
+            if value not in PREPROCESS_PROFILES:
+                raise PatternError(
+                    f"patterns.json: {vendor}.preprocess: {value!r} is not one of {', '.join(PREPROCESS_PROFILES)}"
+                )
+            compiled[field] = value
+        elif field in NON_FIELD_KEYS:
+            compiled[field] = value
+        else:
+            compiled[field] = _compile_field(vendor, field, value)
+    return compiled
+
+
+# ================= LITERAL ANCHORS ================= #
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+def required_literals(pattern: re.Pattern) -> List[str]:
+    """
+    Lower-cased literal runs that every match of `pattern` must contain.
+    Used as a prefilter only: finding the literal does not mean the pattern
+    matches, but not finding it means it cannot.
+    """
+    runs, current = [], []
+
+    def flush():
+        if current:
+            runs.append("".join(current).lower())
+            current.clear()
+
+    def walk(seq):
+        for op, av in seq:
+            if op is sre_constants.LITERAL:
+                current.append(chr(av))
+            elif op is sre_constants.SUBPATTERN:
+                walk(av[-1])
+            elif op in _REPEATS and av[0] >= 1:
+                flush()
+                walk(av[2])
+                flush()
+            else:
+                flush()
+
+    try:
+        walk(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception:
+        return []
+    flush()
+    return runs
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Alternation of `words` factored into a trie so matching cost depends on
+    word length, not on how many words there are. Longest word wins."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+# ================= VENDOR INDEX ================= #
+
+# Shorter anchors hit too often to be worth prefiltering on
+MIN_ANCHOR_LEN = 3
+
+
+class VendorIndex:
+    """
+    One scan over the text for the longest required literal of every
+    vendor's supplier_name regex; only vendors whose anchor shows up are
+    confirmed with their full regex.
+    """
+
+    def __init__(self, vendors: Mapping[str, Dict[str, Any]]):
+        self.order: List[str] = []
+        self.patterns: Dict[str, Tuple[re.Pattern, ...]] = {}
+        self.always: List[str] = []  # no usable anchor - always confirmed
+        self.by_anchor: Dict[str, Set[str]] = {}
+
+        for vendor, cfg in vendors.items():
+            name_pats = cfg.get("supplier_name") or ()
+            if vendor == "default" or not name_pats:
+                continue
+            self.order.append(vendor)
+            self.patterns[vendor] = name_pats
+
+            anchors = []
+            for p in name_pats:
+                longest = max(required_literals(p), key=len, default="")
+                if len(longest) < MIN_ANCHOR_LEN:
+                    anchors = None
+                    break
+                anchors.append(longest)
+            if anchors is None:
+                self.always.append(vendor)
+            else:
+                for a in anchors:
+                    self.by_anchor.setdefault(a, set()).add(vendor)
+
+        # Anchors that are prefixes of a longer anchor hit at the same position
+        self._prefixes = {
+            a: [b for b in self.by_anchor if a.startswith(b)] for a in self.by_anchor
+        }
+        self._scan = re.compile(_trie_regex(list(self.by_anchor)), re.I) if self.by_anchor else None
+
+    def candidates(self, text: str) -> Set[str]:
+        found = set(self.always)
+        if self._scan is None:
+            return found
+
+        pos = 0
+        search = self._scan.search
+        while True:
+            m = search(text, pos)
+            if not m:
+                break
+            hit = m.group(0).lower()
+            prefixes = self._prefixes.get(hit)
+            if prefixes is None:
+                # Case folding produced something unexpected - stay exact
+                return set(self.order)
+            for anchor in prefixes:
+                found |= self.by_anchor[anchor]
+            # Restart one char later so overlapping anchors are not missed
+            pos = m.start() + 1
+        return found
+
+    def matches(self, text: str) -> List[str]:
+        """All vendors whose supplier_name regex matches, in patterns.json order"""
+        found = run_guarded(lambda: self.candidates(text), "*", "vendor_index", len(text),
+                            default=set(self.order))
+        return [
+            v for v in self.order
+            if v in found and run_guarded(
+                lambda: any(p.search(text) for p in self.patterns[v]),
+                v, "supplier_name", len(text), default=False,
+            )
+        ]
+
+
+# ================= FIELD ENGINE ================= #
+
+# Header output key -> patterns.json field, in output order
+HEADER_FIELDS = [
+    ("invoice_number", "invoice_number"),
+    ("invoice_date", "invoice_date"),
+    ("supplier_name", "supplier_name"),
+    ("supplier_gstin", "supplier_gstin"),
+    ("supplier_pan", "supplier_pan"),
+    ("supplier_address", "supplier_address"),
+    ("supplier_phone_no", "supplier_phone_no"),
+    ("supplier_email", "supplier_email_id"),
+    ("account_holder_name", "account_holder_name"),
+    ("account_number", "account_number"),
+    ("ifsc_code", "ifsc_code"),
+    ("buyer_name", "buyer_name"),
+    ("buyer_gstin", "buyer_gstin"),
+    ("taxable_total", "taxable_total"),
+    ("cgst_total_amount", "cgst_total_amount"),
+    ("sgst_total_amount", "sgst_total_amount"),
+    ("igst_total_amount", "igst_total_amount"),
+    ("grand_total", "grand_total"),
+]
+
+
+def leading_literals(pattern: re.Pattern) -> Optional[Set[str]]:
+    """
+    Lower-cased literals one of which every match of `pattern` starts with
+    (zero-width assertions like \\b or ^ are skipped), or None when the
+    pattern can start with anything.
+    """
+    def lead(seq) -> Optional[Set[str]]:
+        prefix = []
+        for op, av in seq:
+            if op is sre_constants.LITERAL:
+                prefix.append(chr(av))
+                continue
+            if prefix:
+                break
+            if op is sre_constants.AT:
+                continue
+            if op is sre_constants.SUBPATTERN:
+                return lead(av[-1])
+            if op is sre_constants.BRANCH:
+                alts = [lead(branch) for branch in av[1]]
+                if any(a is None for a in alts):
+                    return None
+                return set().union(*alts)
+            return None
+        return {"".join(prefix).lower()} if prefix else None
+
+    try:
+        return lead(sre_parse.parse(pattern.pattern, pattern.flags))
+    except Exception:
+        return None
+
+
+# Non-ASCII characters that re.I treats as equal to an ASCII letter; mapping
+# them first makes str.lower() agree with re.I for ASCII anchors
+_ASCII_FOLD = {"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"}
+_ASCII_FOLD_TABLE = str.maketrans(_ASCII_FOLD)
+
+
+def fold(text: str) -> Optional[str]:
+    """Lower-cased copy of `text` with the same offsets, or None if that is not possible"""
+    if not text.isascii() and any(c in text for c in _ASCII_FOLD):
+        text = text.translate(_ASCII_FOLD_TABLE)
+    folded = text.lower()
+    return folded if len(folded) == len(text) else None
+
+
+class AnchorPositions:
+    """
+    Offsets of anchor literals in a folded text. Each anchor is located
+    lazily with str.find() and remembered, so fields sharing an anchor
+    (e.g. "total") reuse the same positions and a field that matches at the
+    first occurrence never looks further.
+    """
+
+    def __init__(self, folded: str):
+        self.folded = folded
+        self._hits: Dict[str, List[int]] = {}
+        self._done: Set[str] = set()
+
+    def occurrences(self, anchor: str) -> Iterator[int]:
+        hits = self._hits.setdefault(anchor, [])
+        i = 0
+        while True:
+            if i < len(hits):
+                yield hits[i]
+                i += 1
+                continue
+            if anchor in self._done:
+                return
+            pos = self.folded.find(anchor, hits[-1] + 1 if hits else 0)
+            if pos < 0:
+                self._done.add(anchor)
+                return
+            hits.append(pos)
+
+    def starts(self, anchors: List[str]) -> Iterator[int]:
+        """Ascending, de-duplicated start offsets of any of `anchors`"""
+        if len(anchors) == 1:
+            return self.occurrences(anchors[0])
+        return self._merged(anchors)
+
+    def _merged(self, anchors: List[str]) -> Iterator[int]:
+        last = -1
+        for pos in heapq.merge(*(self.occurrences(a) for a in anchors)):
+            if pos != last:
+                yield pos
+                last = pos
+
+
+class FieldEngine:
+    """
+    Extracts a set of fields with rx() semantics (first pattern that matches,
+    last group or whole match, stripped) without re-scanning the whole text
+    for every field.
+
+    Every match of an anchored pattern has to start at one of its leading
+    literals, so the pattern is only tried with .match() at those offsets,
+    in ascending order: the first hit is exactly the leftmost match .search()
+    would return. The text is case-folded once and anchor offsets are shared
+    between fields; fields whose literals never occur cost one str.find().
+    Patterns without a usable leading literal fall back to .search().
+    """
+
+    def __init__(self, fields: List[Tuple[str, Tuple[re.Pattern, ...]]], vendor: str = ""):
+        self.vendor = vendor
+        self.plans: List[Tuple[str, List[Tuple[re.Pattern, Optional[List[str]]]]]] = []
+
+        for key, pats in fields:
+            plan = []
+            for p in pats:
+                lits = leading_literals(p)
+                if lits and (min(map(len, lits)) < MIN_ANCHOR_LEN or not all(map(str.isascii, lits))):
+                    lits = None  # "r" hits everywhere; non-ASCII can't be folded safely
+                plan.append((p, sorted(lits) if lits else None))
+            self.plans.append((key, plan))
+
+    @staticmethod
+    def find(pattern: re.Pattern, anchors: Optional[List[str]], text: str,
+             positions: Optional[AnchorPositions]):
+        if anchors is None or positions is None:
+            return pattern.search(text)
+
+        match = pattern.match
+        for pos in positions.starts(anchors):
+            m = match(text, pos)
+            if m:
+                return m
+        return None
+
+    def extract(self, text: str) -> Dict[str, str]:
+        if not text:
+            return {key: "" for key, _ in self.plans}
+
+        folded = fold(text)
+        positions = AnchorPositions(folded) if folded is not None else None
+        out = {}
+        for key, plan in self.plans:
+            value = ""
+            for pattern, anchors in plan:
+                # Timed, and skipped (no match) if it blows the regex budget
+                m = run_guarded(lambda: self.find(pattern, anchors, text, positions),
+                                self.vendor, key, len(text))
+                if m:
+                    value = (m.group(m.lastindex) if m.lastindex else m.group(0)).strip()
+                    break
+            out[key] = value
+        return out
+
+
+# ================= VENDOR MASTER ================= #
+
+GSTIN_RE = re.compile(r"[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]", re.I)
+PAN_RE = re.compile(r"[A-Z]{5}[0-9]{4}[A-Z]")
+
+
+class VendorMaster:
+    """
+    GSTIN / PAN -> vendor key, loaded from vendors.json:
+
+        {"shine_traders": {"gstin": ["33ACUFS2795J1ZC"], "pan": ["ACUFS2795J"]}, ...}
+
+    A PAN entry covers every state registration of the same business.
+    """
+
+    def __init__(self, raw: Dict[str, Dict[str, List[str]]], vendors: Mapping[str, Any] = None,
+                 source: str = "vendors.json"):
+        self.raw = raw
+        self.by_gstin: Dict[str, str] = {}
+        self.by_pan: Dict[str, str] = {}
+
+        for vendor, ids in raw.items():
+            if vendors is not None and vendor not in vendors:
+                raise PatternError(f"{source}: {vendor}: no such vendor in patterns.json")
+            for kind, regex, table in (("gstin", GSTIN_RE, self.by_gstin), ("pan", PAN_RE, self.by_pan)):
+                for value in ids.get(kind, []):
+                    value = value.strip().upper()
+                    if not regex.fullmatch(value):
+                        raise PatternError(f"{source}: {vendor}.{kind}: malformed {kind.upper()} {value!r}")
+                    if table.get(value, vendor) != vendor:
+                        raise PatternError(f"{source}: {kind.upper()} {value} listed for both "
+                                           f"{table[value]} and {vendor}")
+                    table[value] = vendor
+
+    def lookup(self, text: str) -> Tuple[str, str]:
+        """
+        (vendor, "gstin" | "pan") when the GSTINs in the text resolve to exactly
+        one known vendor, ("", "") otherwise - no GSTIN, only unknown ones (e.g.
+        just the buyer's), or several known vendors on the same page.
+        """
+        if not self.by_gstin and not self.by_pan:
+            return "", ""
+
+        found: Dict[str, str] = {}
+        gstins = run_guarded(lambda: GSTIN_RE.findall(text), "*", "gstin_scan", len(text), default=[])
+        for gstin in gstins:
+            gstin = gstin.upper()
+            if gstin in self.by_gstin:
+                found.setdefault(self.by_gstin[gstin], "gstin")
+            elif gstin[2:12] in self.by_pan:
+                found.setdefault(self.by_pan[gstin[2:12]], "pan")
+
+        if len(found) == 1:
+            return next(iter(found.items()))
+        return "", ""
+
+
+def load_vendor_master(path: str, vendors: Mapping[str, Any] = None) -> VendorMaster:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise PatternError(f"{path}: expected an object of vendor entries")
+    return VendorMaster(raw, vendors, source=path)
+
+
+# ================= REGISTRY ================= #
+
+class PatternRegistry(Mapping):
+    def __init__(self, raw: Dict[str, Dict[str, Any]], vendor_master: VendorMaster = None):
+        self.raw = raw
+        self.vendor_master = vendor_master
+        self._vendors = {vendor: _compile_vendor(vendor, cfg) for vendor, cfg in raw.items()}
+        # patterns.json and vendors.json: either one changes what is extracted
+        self.fingerprint = hashlib.sha256(json.dumps(
+            [raw, vendor_master.raw if vendor_master is not None else None], sort_keys=True
+        ).encode("utf-8")).hexdigest()
+        self.vendor_index = VendorIndex(self._vendors)
+        self._header_engines: Dict[str, FieldEngine] = {}
+
+    def header_engine(self, vendor: str) -> FieldEngine:
+        """FieldEngine for the header fields of `vendor` (or default), built once"""
+        engine = self._header_engines.get(vendor)
+        if engine is None:
+            cfg = self._vendors.get(vendor, self._vendors.get("default", {}))
+            engine = FieldEngine([(key, cfg.get(field) or ()) for key, field in HEADER_FIELDS], vendor)
+            self._header_engines[vendor] = engine
+        return engine
+
+    def __getitem__(self, vendor: str) -> Dict[str, Any]:
+        return self._vendors[vendor]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._vendors)
+
+    def __len__(self) -> int:
+        return len(self._vendors)
+
+
+def load_patterns(path: str = "patterns.json", vendor_master: str = "vendors.json") -> PatternRegistry:
+    """Load patterns.json, plus the GSTIN vendor master if that file exists"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise PatternError(f"{path}: expected an object of vendor configs")
+
+    master = None
+    if vendor_master and os.path.exists(vendor_master):
+        master = load_vendor_master(vendor_master, raw)
+    return PatternRegistry(raw, master)
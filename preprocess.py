@@ -0,0 +1,251 @@
+# File - preprocess.py
+"""
+Image preprocessing profiles applied before Tesseract.
+
+    none      - the image as rendered (default; best for clean renders)
+    binarize  - Otsu threshold to a 1-bit image
+    deskew    - rotate by the estimated skew angle, keep grayscale
+    denoise   - binarize, then drop isolated specks
+
+Everything works on NumPy arrays over the whole image - no per-pixel Python.
+The profile is chosen per vendor with a "preprocess" key in patterns.json.
+
+estimate_rotation()/correct() handle photographed invoices independently of
+the profile: quarter-turn orientation plus residual skew.
+"""
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+PROFILES = ("none", "binarize", "deskew", "denoise")
+
+# Skew search range/steps in degrees, on an image downsampled by SKEW_SCALE
+MAX_SKEW = 5.0
+SKEW_STEP = 0.25
+SKEW_FINE_STEP = 0.05
+SKEW_SCALE = 4
+# Smaller angles are left alone
+MIN_SKEW = 0.1
+# Orientation is estimated on a copy whose long side is about this many pixels
+ORIENT_SIZE = 1500
+# Ascender/descender evidence (see _ascender_balance) that decides whether an
+# upright-looking page is upside down; sideways pages always take the better side
+MIN_BALANCE = 0.1
+# Margin evidence (see _margin_alignment) needed to flip when the ascender test is undecided
+MIN_ALIGNMENT = 0.15
+# Row vs column profile variance ratio that settles upright vs sideways on its own
+QUARTER_RATIO = 1.5
+# Vertical strips a page is cut into to find text lines (table columns have their own)
+LINE_STRIPS = 8
+# Bumped when estimate_rotation() changes, so angles cached by an older version are redone
+ORIENT_VERSION = 2
+
+
+def to_gray(img: Image.Image) -> np.ndarray:
+    if img.mode != "L":
+        img = img.convert("L")
+    return np.asarray(img)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Gray level that best separates ink from background"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_bg = cum_mean / weight_bg
+        mean_fg = (cum_mean[-1] - cum_mean) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.nanargmax(between))
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """True where the pixel is background (white) - the polarity of a mode "1" image"""
+    return gray > otsu_threshold(gray)
+
+
+def remove_specks(white: np.ndarray) -> np.ndarray:
+    """Turn ink pixels with at most one ink neighbour (of 8) white"""
+    ink = ~white
+    padded = np.pad(ink, 1).astype(np.uint8)
+    h, w = ink.shape
+    neighbours = sum(
+        padded[1 + dy:1 + dy + h, 1 + dx:1 + dx + w]
+        for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx
+    )
+    return white | (ink & (neighbours <= 1))
+
+
+def estimate_skew(gray: np.ndarray, max_angle: float = MAX_SKEW) -> float:
+    """
+    Skew in degrees (counter-clockwise positive) - the shear that makes the
+    row projection of the ink the most peaked, searched coarse then fine on
+    a downsampled copy.
+    """
+    small = gray[::SKEW_SCALE, ::SKEW_SCALE]
+    ys, xs = np.nonzero(~binarize(small))
+    if len(ys) < 100:
+        return 0.0
+    xs = xs - small.shape[1] / 2.0
+    span = small.shape[0] + small.shape[1]
+
+    def score(angle: float) -> float:
+        rows = np.round(ys + xs * np.tan(np.radians(angle))).astype(np.int64) + span
+        return float(np.var(np.bincount(rows, minlength=3 * span)))
+
+    def best(angles: np.ndarray) -> float:
+        return float(angles[np.argmax([score(a) for a in angles])])
+
+    angle = best(np.arange(-max_angle, max_angle + SKEW_STEP / 2, SKEW_STEP))
+    return best(np.arange(angle - SKEW_STEP, angle + SKEW_STEP + SKEW_FINE_STEP / 2, SKEW_FINE_STEP))
+
+
+def deskew(img: Image.Image, angle: float = None) -> Image.Image:
+    gray = to_gray(img)
+    if angle is None:
+        angle = estimate_skew(gray)
+    if abs(angle) < MIN_SKEW:
+        return img
+    return Image.fromarray(gray).rotate(-angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+
+def _margin_alignment(ink: np.ndarray) -> float:
+    """
+    How much better text lines line up on the left than on the right, in
+    [-1, 1]. Positive for upright left-to-right text (a straight left margin,
+    ragged right ends); an upside-down page mirrors that.
+    """
+    rows = ink.any(axis=1)
+    edges = np.diff(np.concatenate(([0], rows.view(np.int8), [0])))
+    starts, ends = [], []
+    for top, bottom in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        cols = np.flatnonzero(ink[top:bottom].any(axis=0))
+        starts.append(cols[0])
+        ends.append(cols[-1])
+    if len(starts) < 3:
+        return 0.0
+    tolerance = max(2, ink.shape[1] // 300)
+
+    def aligned(positions):
+        return float(np.mean(np.diff(np.sort(positions)) <= tolerance))
+
+    return aligned(starts) - aligned(ends)
+
+
+def _long_runs(ink: np.ndarray, length: int, axis: int) -> np.ndarray:
+    """Ink pixels on a straight run of at least `length` along `axis` (ruled lines)"""
+    a = np.moveaxis(ink, axis, 0).astype(np.int32)
+    n = a.shape[0]
+    if n < length:
+        return np.zeros_like(ink)
+    total = np.concatenate((np.zeros((1,) + a.shape[1:], np.int32), np.cumsum(a, axis=0)))
+    # Windows of `length` that are all ink, then every pixel inside one of them
+    full = (total[length:] - total[:-length]) == length
+    starts = np.concatenate((np.zeros((1,) + full.shape[1:], np.int32), np.cumsum(full, axis=0, dtype=np.int32)))
+    rows = np.arange(n)
+    hi = np.minimum(rows + 1, full.shape[0])
+    lo = np.clip(rows - length + 1, 0, full.shape[0])
+    return np.moveaxis((starts[hi] - starts[lo]) > 0, 0, axis)
+
+
+def _ascender_balance(ink: np.ndarray) -> float:
+    """
+    Ink above the x-height band of each text line against ink below it, in
+    [-1, 1]. Latin text, digits and capitals reach up far more than they hang
+    down, so upright text is positive and an upside-down page mirrors it.
+    Ruled lines are removed first and lines are found per vertical strip, so
+    table columns and dashed rules don't merge the lines of a scanned form.
+    """
+    h, w = ink.shape
+    ink = ink & ~_long_runs(ink, max(10, h // 40), 0) & ~_long_runs(ink, max(10, w // 20), 1)
+    above = below = 0.0
+    for strip in np.array_split(ink, LINE_STRIPS, axis=1):
+        counts = strip.sum(axis=1)
+        if not counts.any():
+            continue
+        rows = counts > max(1, 0.1 * np.percentile(counts[counts > 0], 99))
+        edges = np.diff(np.concatenate(([0], rows.view(np.int8), [0])))
+        lines = [(top, bottom) for top, bottom in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+                 if bottom - top >= 4]
+        if not lines:
+            continue
+        # Taller runs are pictures, stamps or lines that still ran together
+        tallest = 3 * np.median([bottom - top for top, bottom in lines])
+        for top, bottom in lines:
+            if bottom - top > tallest:
+                continue
+            density = counts[top:bottom]
+            core = np.flatnonzero(density >= 0.5 * density.max())
+            above += density[:core[0]].sum()
+            below += density[core[-1] + 1:].sum()
+    return float((above - below) / (above + below)) if above + below else 0.0
+
+
+def estimate_rotation(img: Image.Image) -> Tuple[int, float]:
+    """
+    (orientation, skew) that correct() needs to make the text upright:
+    orientation in quarter turns (0/90/180/270 degrees counter-clockwise),
+    skew in degrees as estimate_skew() of the turned image. Which way up
+    (0 vs 180, 90 vs 270) is decided on a downsampled copy with the skew
+    already removed, by _ascender_balance() with the margins as fallback.
+    """
+    gray = to_gray(img)
+    step = max(1, max(gray.shape) // ORIENT_SIZE)
+    # Box-averaged, not strided: striding drops thin strokes
+    small = np.asarray(Image.fromarray(gray).reduce(step)) if step > 1 else gray
+    ink = ~binarize(small)
+    if not ink.any():
+        return 0, 0.0
+
+    # Text lines make the row profile alternate; sideways text does that in
+    # columns. A single narrow column of lines does both about as much - then
+    # the side whose lines show ascenders and descenders is the upright one
+    rows, cols = ink.mean(axis=1).var(), ink.mean(axis=0).var()
+    if min(rows, cols) * QUARTER_RATIO < max(rows, cols):
+        quarter = 90 if cols > rows else 0
+    else:
+        quarter = 90 if abs(_ascender_balance(np.rot90(ink))) > abs(_ascender_balance(ink)) else 0
+    skew = estimate_skew(np.rot90(gray, k=quarter // 90))
+
+    level = np.ascontiguousarray(np.rot90(ink, k=quarter // 90))
+    # Lines are profiled per strip, so skew only matters once it moves a line
+    # by a pixel across one; levelling a smaller skew just jags the strokes
+    if abs(np.tan(np.radians(skew))) * level.shape[1] / LINE_STRIPS >= 1:
+        level = np.asarray(Image.fromarray(level).rotate(-skew, resample=Image.NEAREST, expand=True, fillcolor=0))
+    # Turning by 180 degrees negates both tests, so one evaluation weighs both sides
+    balance = _ascender_balance(level)
+    if quarter:
+        # Sideways: 90 and 270 are equally likely - take the side the evidence favours
+        flip = balance < 0 if balance else _margin_alignment(level) < 0
+    elif abs(balance) >= MIN_BALANCE:
+        flip = balance < 0
+    else:
+        # Only flip an upright-looking page on clear evidence - ruled forms line up on both sides
+        flip = _margin_alignment(level) < -MIN_ALIGNMENT
+    if flip:
+        quarter += 180
+    return quarter, skew
+
+
+_TRANSPOSE = {90: Image.ROTATE_90, 180: Image.ROTATE_180, 270: Image.ROTATE_270}
+
+
+def correct(img: Image.Image, orientation: int, skew: float) -> Image.Image:
+    if orientation:
+        img = img.transpose(_TRANSPOSE[orientation])
+    return deskew(img, skew)
+
+
+def apply(img: Image.Image, profile: str) -> Image.Image:
+    if profile == "none":
+        return img
+    if profile == "binarize":
+        return Image.fromarray(binarize(to_gray(img)))
+    if profile == "deskew":
+        return deskew(img)
+    if profile == "denoise":
+        return Image.fromarray(remove_specks(binarize(to_gray(img))))
+    raise ValueError(f"unknown preprocess profile {profile!r}")
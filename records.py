@@ -0,0 +1,69 @@
+# File - records.py
+"""
+Compact extraction records.
+
+An invoice's header fields are held once in an InvoiceHeader, and each line
+item is an InvoiceItem that points at it and keeps only its own values. Key
+names live in tuples shared by every record with the same layout. Nothing is
+copied per item until materialize() builds the flat row dicts the outputs
+use - the same dicts, in the same key order, as
+{**header, **item, "file_name": ...}.
+
+Pickling a file's items sends its header once (pickle memoizes the shared
+object), which is what crosses the process pool boundary.
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Key tuples by value: every record with the same keys shares one tuple
+_LAYOUTS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def layout(keys: Iterable[str]) -> Tuple[str, ...]:
+    keys = tuple(keys)
+    return _LAYOUTS.setdefault(keys, keys)
+
+
+class InvoiceHeader:
+    __slots__ = ("keys", "values", "file_name")
+
+    def __init__(self, fields: Dict[str, Any], file_name: str):
+        self.keys = layout(fields)
+        self.values = tuple(fields.values())
+        self.file_name = file_name
+
+    def __getstate__(self):
+        return self.keys, self.values, self.file_name
+
+    def __setstate__(self, state):
+        keys, self.values, self.file_name = state
+        self.keys = layout(keys)
+
+
+class InvoiceItem:
+    __slots__ = ("header", "keys", "values")
+
+    def __init__(self, header: InvoiceHeader, fields: Dict[str, Any]):
+        self.header = header
+        keys = tuple(fields)
+        self.keys = _LAYOUTS.setdefault(keys, keys)     # layout(), inlined: one per line item
+        self.values = tuple(fields.values())
+
+    def __getstate__(self):
+        return self.header, self.keys, self.values
+
+    def __setstate__(self, state):
+        self.header, keys, self.values = state
+        self.keys = layout(keys)
+
+    def to_row(self) -> Dict[str, Any]:
+        """The flat row: header fields, then the item's (an item value wins), then file_name"""
+        header = self.header
+        row = dict(zip(header.keys, header.values))
+        row.update(zip(self.keys, self.values))
+        row["file_name"] = header.file_name
+        return row
+
+
+def materialize(records: List[Any]) -> List[Dict[str, Any]]:
+    """Flat row dicts for a list of records; rows that are already dicts pass through"""
+    return [r if isinstance(r, dict) else r.to_row() for r in records]
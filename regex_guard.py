@@ -0,0 +1,146 @@
+# File - regex_guard.py
+"""
+Timing and time budgets for regex evaluation.
+
+run_guarded() times one pattern evaluation and, where possible, aborts it
+once it has burned `budget` seconds of CPU. Python's regex engine checks for
+signals while it backtracks, so a SIGVTALRM handler that raises is enough
+to break out of a runaway pattern. This needs POSIX timers and the main
+thread (true for batch workers); elsewhere evaluations are only timed.
+
+ITIMER_VIRTUAL is used on purpose: ITIMER_REAL is taken by the per-file
+timeout in app.py.
+"""
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class PatternTimeout(Exception):
+    pass
+
+
+class PatternStats:
+    """Per (vendor, field) timings plus a log of evaluations that blew the budget"""
+
+    def __init__(self):
+        # (vendor, field) -> [calls, total_s, max_s, skipped, max_input_chars]
+        self.fields: Dict[Tuple[str, str], List[float]] = {}
+        self.skipped: List[Dict[str, Any]] = []
+
+    def record(self, vendor: str, field: str, size: int, elapsed: float, skipped: bool = False) -> None:
+        entry = self.fields.get((vendor, field))
+        if entry is None:
+            entry = self.fields[(vendor, field)] = [0, 0.0, 0.0, 0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        entry[4] = max(entry[4], size)
+        if skipped:
+            entry[3] += 1
+            self.skipped.append({"vendor": vendor, "field": field, "input_chars": size,
+                                 "elapsed": round(elapsed, 4)})
+
+    def reset(self) -> None:
+        self.fields.clear()
+        self.skipped.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Picklable/JSON form, also what merge() accepts"""
+        return {
+            "fields": [[v, f, *entry] for (v, f), entry in self.fields.items()],
+            "skipped": list(self.skipped),
+        }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        for vendor, field, calls, total, peak, skipped, size in data.get("fields", []):
+            entry = self.fields.get((vendor, field))
+            if entry is None:
+                entry = self.fields[(vendor, field)] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += calls
+            entry[1] += total
+            entry[2] = max(entry[2], peak)
+            entry[3] += skipped
+            entry[4] = max(entry[4], size)
+        self.skipped.extend(data.get("skipped", []))
+
+    def slowest(self, n: int = 10) -> List[Dict[str, Any]]:
+        """Patterns ranked by total time spent in them"""
+        ranked = sorted(self.fields.items(), key=lambda kv: kv[1][1], reverse=True)
+        return [
+            {
+                "vendor": vendor, "field": field, "calls": int(calls),
+                "total_ms": round(total * 1e3, 3), "mean_ms": round(total / calls * 1e3, 3) if calls else 0.0,
+                "max_ms": round(peak * 1e3, 3), "skipped": int(skipped), "max_input_chars": int(size),
+            }
+            for (vendor, field), (calls, total, peak, skipped, size) in ranked[:n]
+        ]
+
+    def report(self, n: int = 10) -> str:
+        lines = [f"{'vendor':24} {'field':28} {'calls':>6} {'total ms':>10} {'max ms':>9} {'skipped':>7}"]
+        for r in self.slowest(n):
+            lines.append(f"{r['vendor'][:24]:24} {r['field'][:28]:28} {r['calls']:6d} "
+                         f"{r['total_ms']:10.2f} {r['max_ms']:9.2f} {r['skipped']:7d}")
+        return "\n".join(lines)
+
+
+# Collected by every run_guarded() call in this process
+STATS = PatternStats()
+
+# Default CPU-seconds budget per pattern evaluation (0 = time only, never abort)
+BUDGET = 1.0
+
+_active = False
+_installed = False
+
+
+def _on_budget(signum, frame):
+    if _active:
+        raise PatternTimeout()
+
+
+def _can_arm(budget: float) -> bool:
+    global _installed
+    # Nested guard - the outer one's timer covers this evaluation too
+    if not budget or _active or not hasattr(signal, "setitimer"):
+        return False
+    if threading.get_ident() != threading.main_thread().ident:
+        return False
+    if not _installed:
+        signal.signal(signal.SIGVTALRM, _on_budget)
+        _installed = True
+    return True
+
+
+def run_guarded(fn: Callable[[], Any], vendor: str, field: str, size: int,
+                budget: float = None, default: Any = None) -> Any:
+    """
+    Call fn() and record its duration under (vendor, field). If it runs over
+    `budget` CPU seconds it is interrupted, reported in STATS.skipped and
+    `default` is returned instead.
+    """
+    global _active
+    if budget is None:
+        budget = BUDGET
+    armed = _can_arm(budget)
+
+    start = time.perf_counter()
+    result, skipped = default, False
+    try:
+        try:
+            if armed:
+                _active = True
+                signal.setitimer(signal.ITIMER_VIRTUAL, budget)
+            result = fn()
+        finally:
+            if armed:
+                _active = False
+                signal.setitimer(signal.ITIMER_VIRTUAL, 0)
+    except PatternTimeout:
+        if not armed:
+            raise  # an outer guard's budget ran out - let it handle that
+        result, skipped = default, True
+
+    STATS.record(vendor, field, size, time.perf_counter() - start, skipped)
+    return result
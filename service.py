@@ -0,0 +1,367 @@
+# File - service.py
+"""
+Service mode: the invoice pipeline behind a local HTTP API.
+
+    python service.py [--host H] [--port P] [--workers N] [--queue N]
+
+    POST /invoices?name=bill.pdf   raw file body, or multipart/form-data with a file field
+        -> {"Data": [rows], "checks": [...]}   the rows process_file() + post_process() give
+                                   for it, and the invoice totals they don't add up to
+    GET  /health                   -> {"status": "ok", "workers": N, "busy": n, "queued": n, ...}
+    GET  /metrics                  -> per-stage totals in Prometheus text format
+
+patterns.json is compiled once at startup and handed to a process pool whose
+workers stay up, with their OCR engine and cache, between requests. The event
+loop only parses HTTP and spools uploads to a temp dir; OCR and extraction run
+in the pool. At most `workers` files are in the pool at a time, up to `queue`
+more wait for a free worker, and anything beyond that is refused with 503 and
+Retry-After - before its body is read - so callers back off instead of piling
+up here. Accepted bodies are streamed to the spool in UPLOAD_CHUNK pieces and
+never held in memory whole.
+"""
+import os
+import json
+import time
+import mmap
+import shutil
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from email.parser import BytesParser
+from email.policy import HTTP
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import app
+from metrics import Metrics
+from pattern_registry import load_patterns
+from records import materialize
+
+# Seconds a refused client is told to wait before retrying
+RETRY_AFTER = 5
+# Bytes read from the socket (and written to the spool) at a time
+UPLOAD_CHUNK = 64 * 1024
+
+
+def _init_service_worker(patterns: Dict[str, Dict[str, Any]], page_threads: int = 1) -> None:
+    app._init_worker(patterns, page_threads)
+    # Bring the OCR engine and cache up now rather than on the first upload
+    app.get_ocr_backend()
+    app.get_ocr_cache()
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+async def _receive(reader: asyncio.StreamReader, length: int, path: str) -> None:
+    """Copy `length` bytes of request body to `path`, UPLOAD_CHUNK at a time"""
+    with open(path, "wb") as f:
+        while length:
+            chunk = await reader.readexactly(min(UPLOAD_CHUNK, length))
+            length -= len(chunk)
+            await asyncio.to_thread(f.write, chunk)
+
+
+async def _discard(reader: asyncio.StreamReader, length: int) -> None:
+    """Read and drop an unread body, so closing the connection doesn't reset it under the response"""
+    while length:
+        length -= len(await reader.readexactly(min(UPLOAD_CHUNK, length)))
+
+
+def upload_name(name: str) -> str:
+    """Bare file name of an upload (no directories, whatever the client's OS)"""
+    return os.path.basename((name or "").replace("\\", "/")).strip()
+
+
+def extract_multipart(content_type: str, source: str, folder: str) -> str:
+    """
+    Write the first file part of the multipart/form-data body in `source` to
+    `folder` under its bare file name, which is returned ("" if there is none).
+    The body is searched through mmap, so it is never read into memory whole.
+    """
+    boundary = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n", headersonly=True
+    ).get_boundary()
+    if not boundary or not os.path.getsize(source):
+        return ""
+    delimiter = b"--" + boundary.encode("latin-1")
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as body:
+        start = body.find(delimiter)
+        while start >= 0 and body[start + len(delimiter):start + len(delimiter) + 2] != b"--":
+            head = body.find(b"\r\n", start) + 2
+            data = body.find(b"\r\n\r\n", head) + 4
+            end = body.find(b"\r\n" + delimiter, data)
+            if head < 2 or data < 4 or end < 0:
+                return ""
+            part = BytesParser(policy=HTTP).parsebytes(body[head:data], headersonly=True)
+            name = upload_name(part.get_filename() or "")
+            if name not in ("", ".", ".."):
+                with open(os.path.join(folder, name), "wb") as out:
+                    for offset in range(data, end, UPLOAD_CHUNK):
+                        out.write(body[offset:min(offset + UPLOAD_CHUNK, end)])
+                return name
+            start = end + 2
+    return ""
+
+
+class InvoiceService:
+    def __init__(self, patterns: Dict[str, Dict[str, Any]], workers: int = app.WORKERS,
+                 queue_size: int = app.SERVICE_QUEUE, timeout: float = app.FILE_TIMEOUT,
+                 max_upload: int = app.SERVICE_MAX_UPLOAD):
+        self.patterns = patterns
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self.max_upload = max_upload
+        self.metrics = Metrics()
+        self.counters = Counter()
+        self.busy = 0
+        self.queued = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._spool_dir = tempfile.mkdtemp(prefix="invoice_service_")
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # "spawn": this process has threads (event loop executors, the old pool's
+        # manager after a crash), so forking workers from it can deadlock them
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_service_worker,
+                                   initargs=(self.patterns, app.page_workers(self.workers)))
+
+    async def start(self) -> None:
+        """Start every worker up front so the first uploads don't pay for it"""
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pool = self._new_pool()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _worker_ready) for _ in range(self.workers)))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        shutil.rmtree(self._spool_dir, ignore_errors=True)
+
+    # ================= PIPELINE ================= #
+
+    @property
+    def full(self) -> bool:
+        return self.busy + self.queued >= self.workers + self.queue_size
+
+    @staticmethod
+    def check_upload(name: str, size: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(HTTP status, response body) refusing an upload, or None if it can go ahead"""
+        if os.path.splitext(name)[1].lower() not in app.SUPPORTED_EXT:
+            return 415, {"error": f"unsupported file type {name!r}",
+                         "supported": sorted(app.SUPPORTED_EXT)}
+        if not size:
+            return 400, {"error": "empty upload"}
+        return None
+
+    async def process(self, reader: asyncio.StreamReader, length: int, name: str,
+                      multipart: str = "") -> Tuple[int, Dict[str, Any]]:
+        """
+        (HTTP status, response body) for one uploaded invoice: `length` bytes
+        of body on `reader`, the file itself or, when `multipart` is its
+        Content-Type, a multipart/form-data form with a file field. The caller
+        has checked there is room (see `full`); the upload takes its queue
+        place before the first await.
+        """
+        self.counters["requests"] += 1
+        # One directory per upload keeps the client's file name (it ends up in file_name)
+        folder = tempfile.mkdtemp(dir=self._spool_dir)
+        self.queued += 1
+        waiting = True
+        wait = time.perf_counter()
+        try:
+            if multipart:
+                source = folder + ".form"
+                try:
+                    await _receive(reader, length, source)
+                    name = await asyncio.to_thread(extract_multipart, multipart, source, folder)
+                finally:
+                    os.remove(source)
+                path = os.path.join(folder, name)
+                refused = self.check_upload(name, os.path.getsize(path) if name else 0)
+                if refused:
+                    return refused
+            else:
+                path = os.path.join(folder, name)
+                await _receive(reader, length, path)
+            async with self._slots:
+                self.queued -= 1
+                waiting = False
+                self.busy += 1
+                self.metrics.record("queue_wait", time.perf_counter() - wait, 0.0)
+                try:
+                    result = await self._run(path)
+                finally:
+                    self.busy -= 1
+        finally:
+            if waiting:
+                self.queued -= 1
+            shutil.rmtree(folder, ignore_errors=True)
+
+        if result is None:
+            self.counters["failed"] += 1
+            return 500, {"error": "worker process crashed", "Data": []}
+
+        self.metrics.merge(result.metrics)
+        rows = materialize(result.rows)
+        with self.metrics.stage("post_process", nbytes=len(rows)):
+            checks = app.post_process(rows)
+        self.metrics.events.clear()
+        if result.error:
+            self.counters["failed"] += 1
+            return (504 if result.error.startswith("timed out") else 422), \
+                {"error": result.error, "Data": rows}
+        return 200, {"Data": rows, "checks": checks}
+
+    async def _run(self, path: str) -> Optional["app.FileResult"]:
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            return await loop.run_in_executor(pool, app._process_file_task, path, None, self.timeout)
+        except BrokenProcessPool:
+            # A worker died (and took the pool with it) - start a fresh one for later uploads
+            if self._pool is pool:
+                self._pool = self._new_pool()
+                pool.shutdown(wait=False, cancel_futures=True)
+            return None
+
+    def health(self) -> Dict[str, Any]:
+        return {"status": "ok", "workers": self.workers, "busy": self.busy, "queued": self.queued,
+                "queue_size": self.queue_size, "requests": self.counters["requests"],
+                "rejected": self.counters["rejected"], "failed": self.counters["failed"]}
+
+    def prometheus(self) -> str:
+        return self.metrics.to_prometheus(extra={
+            "requests_total": self.counters["requests"],
+            "requests_rejected_total": self.counters["rejected"],
+            "files_failed_total": self.counters["failed"],
+            "workers_busy": self.busy,
+            "queue_depth": self.queued,
+        })
+
+    # ================= HTTP ================= #
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """One request per connection (Connection: close)"""
+        try:
+            status, body, headers, unread = await self._dispatch(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except ValueError as e:
+            status, body, headers, unread = 400, {"error": str(e)}, {}, 0
+
+        if isinstance(body, str):
+            payload, content_type = body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}", "Connection: close"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+            await writer.drain()
+            if unread:
+                await asyncio.wait_for(_discard(reader, unread), RETRY_AFTER)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str], int]:
+        """(status, response body, extra headers, body bytes left unread) for one request"""
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise ConnectionError("client closed the connection")
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ValueError(f"bad request line {request_line!r}")
+        method, target, _ = parts
+        headers = await self._read_headers(reader)
+        url = urlsplit(target)
+        route = url.path.rstrip("/") or "/"
+
+        if route == "/health":
+            return (200, self.health(), {}, 0) if method == "GET" else \
+                (405, {"error": "use GET"}, {"Allow": "GET"}, 0)
+        if route == "/metrics":
+            return (200, self.prometheus(), {}, 0) if method == "GET" else \
+                (405, {"error": "use GET"}, {"Allow": "GET"}, 0)
+        if route != "/invoices":
+            return 404, {"error": f"no route {url.path!r}"}, {}, 0
+        if method != "POST":
+            return 405, {"error": "use POST"}, {"Allow": "POST"}, 0
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            return 411, {"error": "Content-Length required"}, {}, 0
+        length = int(headers.get("content-length") or 0)
+        if length > self.max_upload:
+            return 413, {"error": f"upload larger than {self.max_upload} bytes"}, {}, 0
+
+        # Everything that can refuse the upload is decided before its body is read
+        content_type = headers.get("content-type", "")
+        multipart = content_type if content_type.lower().startswith("multipart/form-data") else ""
+        name = upload_name((parse_qs(url.query).get("name") or [""])[0])
+        refused = None if multipart else self.check_upload(name, length)
+        if refused:
+            return refused + ({}, length)
+        # Backpressure: refuse rather than queue without bound
+        if self.full:
+            self.counters["rejected"] += 1
+            return 503, {"error": "all workers busy and queue full", "retry_after": RETRY_AFTER}, \
+                {"Retry-After": str(RETRY_AFTER)}, length
+        status, result = await self.process(reader, length, name, multipart)
+        return status, result, {}, 0
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+    async def serve(self, host: str = app.SERVICE_HOST, port: int = app.SERVICE_PORT) -> None:
+        await self.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🔥 INVOICE SERVICE on http://{host}:{port} ({self.workers} workers, queue {self.queue_size}) 🔥")
+        async with server:
+            await server.serve_forever()
+
+
+# ================= MAIN ================= #
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=app.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=app.SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=app.WORKERS, help="OCR worker processes")
+    parser.add_argument("--queue", type=int, default=app.SERVICE_QUEUE,
+                        help="uploads that may wait for a worker before 503")
+    args = parser.parse_args(argv)
+
+    # Compiled and validated once; a bad regex stops the service here
+    patterns = load_patterns("patterns.json", app.VENDOR_MASTER)
+    service = InvoiceService(patterns, args.workers, args.queue)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
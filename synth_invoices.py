@@ -0,0 +1,356 @@
+# File - synth_invoices.py
+"""
+Synthetic invoices for load, scaling and accuracy tests.
+
+    python synth_invoices.py generate OUT_DIR [--count N] [--layouts ...] [--items MIN MAX]
+                             [--pages N] [--scanned FRACTION] [--noise 0..1] [--rotation DEG]
+                             [--format pdf|png|jpg] [--seed S]
+    python synth_invoices.py check OUT_DIR
+
+Every document follows one of the layouts patterns.json is written for
+(rk_security_services, shine_traders, shri_sivaayam_traders, default) with
+random numbers, items and dates, and is written next to a ground-truth
+<name>.json holding the vendor, header values and items it prints.
+
+Text-layer PDFs are written with PyMuPDF. Scanned variants are rendered to
+grayscale, optionally noised and rotated, and saved as image-only PDFs (or
+PNG/JPG files, first page only). `check` runs app.process_file() over a
+generated folder and reports field and item accuracy per layout.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import fitz  # PyMuPDF
+from PIL import Image
+
+LAYOUTS = ["rk_security_services", "shine_traders", "shri_sivaayam_traders", "default"]
+
+PAGE_W, PAGE_H = 595, 842      # A4 in points
+MARGIN, FONT_SIZE, LEADING = 40, 9, 11.5
+SCAN_DPI = 200
+
+CATALOG = [
+    ("A4 PUNCH FOLDER", "39261019", "NOS"), ("BOX FILE", "48201000", "NOS"),
+    ("STAPLER", "84729010", "NOS"), ("PRINTER PAPER A4", "48025690", "REAM"),
+    ("WHITEBOARD MARKER", "96081019", "NOS"), ("CEMENT OPC 53", "25232930", "BAGS"),
+    ("BINDING WIRE", "72172020", "KGS"), ("PVC CONDUIT PIPE", "39172390", "NOS"),
+    ("LED TUBE LIGHT", "94054090", "NOS"), ("SAFETY HELMET", "65061010", "NOS"),
+]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def inr(value: float, decimals: int = 2) -> str:
+    """Indian digit grouping: 108000 -> 1,08,000.00"""
+    text = f"{abs(value):.{decimals}f}"
+    whole, _, frac = text.partition(".")
+    if len(whole) > 3:
+        head, tail = whole[:-3], whole[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        whole = ",".join(([head] if head else []) + groups + [tail])
+    return ("-" if value < 0 else "") + whole + ("." + frac if frac else "")
+
+
+def _goods(rng: random.Random, count: int, rate: int = 18, whole: bool = False) -> List[Dict[str, Any]]:
+    items = []
+    for name, hsn, unit in rng.sample(CATALOG, min(count, len(CATALOG))) + \
+            [rng.choice(CATALOG) for _ in range(count - len(CATALOG))]:
+        qty = rng.randint(1, 60)
+        price = float(rng.randint(5, 900)) if whole else round(rng.uniform(5, 900), 2)
+        items.append({"item_name": name, "hsn_code": hsn, "quantity": str(qty), "unit": unit,
+                      "unit_price": price, "amount": round(qty * price, 2), "gst_rate": str(rate)})
+    return items
+
+
+def _totals(items: List[Dict[str, Any]]) -> Tuple[float, float, float]:
+    taxable = round(sum(i["amount"] for i in items), 2)
+    half = round(sum(i["amount"] * int(i["gst_rate"]) / 200.0 for i in items), 2)
+    return taxable, half, float(round(taxable + 2 * half))
+
+
+# ================= LAYOUTS ================= #
+
+def layout_shine(rng: random.Random, n_items: int):
+    # Shine bills in whole rupees ("CGST 9.00% for 5844.00 = ...")
+    items = _goods(rng, n_items, rate=18, whole=True)
+    taxable, half, grand = _totals(items)
+    number, date = str(rng.randint(100, 9999)), f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.24"
+    lines = [
+        "| SHINE TRADERS",
+        "L64/305, Police Quarters, Ganapathy, Coimbatore - 641 006",
+        "Ph : 9443335335 Email : shinetraders.cbe@gmail.com",
+        "GSTIN : 33ACUFS2795J1ZC State Code : 33",
+        f"M/S. COMTEN CONSULTING ENGINEERS Pvt LTD No. : {number}",
+        f"GSTIN 33AAHCC5169N1Z9 GSTIN Date : {date}",
+    ]
+    for n, i in enumerate(items, 1):
+        lines.append(f"{n} {i['item_name']} {i['hsn_code']} {i['quantity']} {i['unit_price']:.2f} "
+                     f"{i['unit']} {i['gst_rate']} {i['amount']:.2f}")
+    lines += [
+        f"Taxable Total {taxable:.2f}",
+        f"| CGST 9.00% for {taxable:.2f} = {half:.2f}",
+        f"SGST 9.00 % for {taxable:.2f} = {half:.2f}",
+        "Union Bank of india Alc No. 510101000524637 IFSC : UBIN0921050",
+        f"Grand Total {grand:.2f}",
+    ]
+    header = {"invoice_number": number, "invoice_date": date, "supplier_name": "SHINE TRADERS",
+              "supplier_gstin": "33ACUFS2795J1ZC", "taxable_total": taxable,
+              "cgst_total_amount": half, "sgst_total_amount": half, "grand_total": grand}
+    return lines, header, items
+
+
+def layout_sivaayam(rng: random.Random, n_items: int):
+    items = _goods(rng, n_items, rate=28)
+    taxable, half, grand = _totals(items)
+    number = f"{rng.randint(1, 999)}/2025-26"
+    date = f"{rng.randint(1, 28)}-{rng.choice(MONTHS)}-25"
+    lines = [
+        "Tax Invoice", "SHRI SIVAAYAM TRADERS", "801/1, Kalapatti Road,", "Nehru Nagar,Coimbatore - 641 048",
+        "GSTIN/UIN: 33ACDFA0359B1Z4", "State Name :  Tamil Nadu, Code : 33",
+        "Contact : 7871878999, 8680078999", "E-Mail : shrisivaayamtraders@gmail.com",
+        "Buyer (Bill to)", "COMTEN CONSULTING ENGINEERS PVT LTD", "GSTIN/UIN", ": 33AAHCC5169N1Z9",
+        "Invoice No.", number, "Dated", date,
+        "Sl", "Description of Goods", "Amount", "Rate", "Quantity", "HSN/SAC",
+    ]
+    for n, i in enumerate(items, 1):
+        gross = round(i["amount"] * 1.28, 2)
+        lines += [f"{n} {i['item_name'].title()}", inr(i["amount"]), inr(gross), i["unit"].title(),
+                  inr(i["unit_price"]), inr(round(i["unit_price"] * 1.28, 2)),
+                  f"{i['quantity']} {i['unit'].title()}", i["hsn_code"]]
+    lines += [
+        inr(taxable), "CGST@14%", inr(half), "%", "14", "SGST@14%", inr(half), "%", "14",
+        "Total", f"₹ {inr(grand)}", "Amount Chargeable (in words)",
+        "Company’s PAN", ": ACDFA0359B", "A/c No.", ": 999 19 19 19 29 999",
+        "Branch & IFS Code", ": KALAPAPATTI MAIN ROAD & HDFC0001068", "for SHRI SIVAAYAM TRADERS",
+    ]
+    header = {"invoice_number": number, "invoice_date": date, "supplier_name": "SHRI SIVAAYAM TRADERS",
+              "supplier_gstin": "33ACDFA0359B1Z4", "supplier_pan": "ACDFA0359B", "grand_total": grand}
+    return lines, header, items
+
+
+def layout_rk(rng: random.Random, n_items: int):
+    items, heads = [], []
+    for n in range(n_items):
+        role = "Security Officer" if n % 2 == 0 else "Security Guard"
+        rate, days = rng.choice([18000, 21000, 29000]), rng.randint(20, 190)
+        items.append({"item_name": role, "hsn_code": "998522", "quantity": f"{days}.00", "unit": "Man days",
+                      "unit_price": rate, "amount": float(round(rate / 30.0 * days)), "gst_rate": "18"})
+        heads.append(rng.randint(1, 8))
+    taxable, half, grand = _totals(items)
+    half = float(round(half))
+    grand = taxable + 2 * half
+    number, date = str(rng.randint(202400000, 202499999)), \
+        f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-2024"
+    lines = [
+        "R K Security Services", "No. 86, Nehru Street, Gandhipuram, Coimbatore - 15",
+        "Phone : 0422-2345678  Email rksecurities2014@gmail.com",
+        "GSTIN 33AAKFR1234M1ZQ PAN AAKFR1234M",
+        f"Tax Invoice No {number}  Invoice Date {date}", "Service Details",
+    ]
+    for n, (i, count) in enumerate(zip(items, heads), 1):
+        lines.append(f"{n} {i['item_name']} ({count} Nos) {i['unit_price']} {i['quantity']} "
+                     f"{inr(i['amount'], 0)}")
+    lines += [f"Total {inr(taxable, 0)}", f"CGST @ 9% {inr(half, 0)}", f"SGST @ 9% {inr(half, 0)}",
+              f"Grand Total {inr(grand)}", "A/c No: 123456789012 ICIC0001234"]
+    header = {"invoice_number": number, "invoice_date": date, "supplier_name": "R K Security Services",
+              "supplier_gstin": "33AAKFR1234M1ZQ", "supplier_pan": "AAKFR1234M", "grand_total": grand}
+    return lines, header, items
+
+
+def layout_default(rng: random.Random, n_items: int):
+    items = _goods(rng, n_items, rate=rng.choice([5, 12, 18]))
+    taxable, half, grand = _totals(items)
+    company = rng.choice(["ACME", "ORION", "VEGA", "NOVA", "ZENITH"])
+    pan = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(5)) + \
+        f"{rng.randint(1000, 9999)}" + rng.choice("ABCDEFGH")
+    gstin = f"29{pan}1Z{rng.randint(1, 9)}"
+    number, date = f"{rng.randint(1, 999)}/23-24", f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2024"
+    lines = [f"{company} Supplies Pvt Ltd", f"Supplier: {company}",
+             f"Invoice No: {number} Date: {date}", f"GSTIN: {gstin} PAN: {pan}"]
+    for i in items:
+        lines.append(f"{i['item_name'].title()} {i['hsn_code']} {i['quantity']} {i['unit_price']:.2f} "
+                     f"{i['unit']} {i['gst_rate']} {i['amount']:.2f}")
+    lines.append(f"Grand Total {inr(grand)}")
+    header = {"invoice_number": number, "invoice_date": date, "supplier_name": company,
+              "supplier_gstin": gstin, "supplier_pan": pan, "grand_total": grand}
+    return lines, header, items
+
+
+LAYOUT_FUNCS = {
+    "rk_security_services": layout_rk,
+    "shine_traders": layout_shine,
+    "shri_sivaayam_traders": layout_sivaayam,
+    "default": layout_default,
+}
+
+
+# ================= RENDERING ================= #
+
+def text_pdf(lines: List[str], pages: int) -> "fitz.Document":
+    """Lines spread over at least `pages` pages (more if they don't fit)"""
+    per_page = int((PAGE_H - 2 * MARGIN) // LEADING)
+    pages = max(pages, -(-len(lines) // per_page))
+    per_page = -(-len(lines) // pages)
+    doc = fitz.open()
+    for start in range(0, pages * per_page, per_page):
+        page = doc.new_page(width=PAGE_W, height=PAGE_H)
+        for n, line in enumerate(lines[start:start + per_page]):
+            page.insert_text((MARGIN, MARGIN + (n + 1) * LEADING), line, fontsize=FONT_SIZE)
+    return doc
+
+
+def scan(page: "fitz.Page", rng: np.random.Generator, noise: float, rotation: float) -> Image.Image:
+    """Grayscale render with speckle/gaussian noise and a rotation, like a phone or flatbed scan"""
+    pix = page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    if noise:
+        noisy = gray.astype(np.float32) + rng.normal(0, 25 * noise, gray.shape)
+        specks = rng.random(gray.shape) < 0.01 * noise
+        noisy[specks] = rng.choice([0, 255], size=int(specks.sum()))
+        gray = np.clip(noisy, 0, 255).astype(np.uint8)
+    img = Image.fromarray(np.ascontiguousarray(gray))
+    if rotation:
+        img = img.rotate(rotation, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return img
+
+
+def image_pdf(images: List[Image.Image]) -> "fitz.Document":
+    import io
+
+    doc = fitz.open()
+    for img in images:
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        page = doc.new_page(width=img.width * 72.0 / SCAN_DPI, height=img.height * 72.0 / SCAN_DPI)
+        page.insert_image(page.rect, stream=buf.getvalue())
+    return doc
+
+
+def generate(out_dir: str, count: int, layouts: List[str] = None, items: Tuple[int, int] = (1, 5),
+             pages: int = 1, scanned: float = 0.0, noise: float = 0.0, rotation: float = 0.0,
+             fmt: str = "pdf", seed: int = 0) -> List[str]:
+    """Write `count` invoices plus ground truth into out_dir and return the invoice paths"""
+    layouts = layouts or LAYOUTS
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for n in range(count):
+        layout = layouts[n % len(layouts)]
+        lines, header, item_rows = LAYOUT_FUNCS[layout](rng, rng.randint(*items))
+        is_scanned = rng.random() < scanned
+        angle = rng.uniform(-rotation, rotation) if is_scanned and rotation else 0.0
+        name = f"synth_{n:05d}_{layout}"
+
+        doc = text_pdf(lines, pages)
+        if not is_scanned:
+            path = os.path.join(out_dir, name + ".pdf")
+            doc.save(path)
+        else:
+            images = [scan(page, np_rng, noise, angle) for page in doc]
+            if fmt == "pdf":
+                path = os.path.join(out_dir, name + ".pdf")
+                with image_pdf(images) as scanned_doc:
+                    scanned_doc.save(path)
+            else:
+                path = os.path.join(out_dir, f"{name}.{fmt}")
+                images[0].save(path)
+        page_count = doc.page_count
+        doc.close()
+
+        truth = {
+            "file": os.path.basename(path), "vendor": layout, "scanned": is_scanned,
+            "pages": page_count if fmt == "pdf" or not is_scanned else 1,
+            "noise": noise if is_scanned else 0.0, "rotation": round(angle, 2),
+            "header": header,
+            "items": [{k: str(v) if not isinstance(v, float) else f"{v:.2f}" for k, v in row.items()}
+                      for row in item_rows],
+        }
+        with open(os.path.join(out_dir, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(truth, f, indent=2)
+        paths.append(path)
+    return paths
+
+
+# ================= ACCURACY CHECK ================= #
+
+def _same(field: str, expected: Any, got: Any) -> bool:
+    import app
+
+    if isinstance(expected, (int, float)):
+        return abs(app.clean_number(str(got)) - expected) < 0.01
+    return " ".join(str(expected).split()).lower() == " ".join(str(got or "").split()).lower()
+
+
+def check(out_dir: str) -> Dict[str, Dict[str, float]]:
+    """Extract every generated invoice and score it against its ground truth, per layout"""
+    import app
+
+    registry = app.load_patterns("patterns.json", app.VENDOR_MASTER)
+    scores: Dict[str, Dict[str, float]] = {}
+    for name in sorted(os.listdir(out_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(out_dir, name), "r", encoding="utf-8") as f:
+            truth = json.load(f)
+        rows = app.process_file(os.path.join(out_dir, truth["file"]), registry)
+        header = rows[0] if rows else {}
+        extracted = [r for r in rows if r.get("amount")]
+
+        s = scores.setdefault(truth["vendor"], {"docs": 0, "vendor": 0, "fields": 0, "fields_ok": 0,
+                                                "items": 0, "items_ok": 0})
+        s["docs"] += 1
+        s["vendor"] += header.get("vendor") == truth["vendor"]
+        for field, expected in truth["header"].items():
+            s["fields"] += 1
+            s["fields_ok"] += _same(field, expected, header.get(field))
+        # Items are matched by amount, in any order
+        amounts = [app.clean_number(str(r.get("amount"))) for r in extracted]
+        for want in truth["items"]:
+            hit = next((a for a in amounts if abs(a - float(want["amount"])) < 0.01), None)
+            if hit is not None:
+                amounts.remove(hit)
+                s["items_ok"] += 1
+        s["items"] += len(truth["items"])
+    return scores
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["generate", "check"])
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=LAYOUTS)
+    parser.add_argument("--items", type=int, nargs=2, default=[1, 5], metavar=("MIN", "MAX"))
+    parser.add_argument("--pages", type=int, default=1, help="minimum pages per invoice")
+    parser.add_argument("--scanned", type=float, default=0.0, help="fraction rendered as scans")
+    parser.add_argument("--noise", type=float, default=0.0, help="scan noise, 0..1")
+    parser.add_argument("--rotation", type=float, default=0.0, help="max scan rotation in degrees")
+    parser.add_argument("--format", choices=["pdf", "png", "jpg"], default="pdf", help="format of scans")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        paths = generate(args.out_dir, args.count, args.layouts, tuple(args.items), args.pages,
+                         args.scanned, args.noise, args.rotation, args.format, args.seed)
+        print(f"{len(paths)} invoice(s) written to {args.out_dir}")
+        return 0
+
+    scores = check(args.out_dir)
+    print(f"{'layout':24} {'docs':>5} {'vendor':>7} {'fields':>7} {'items':>7}")
+    for layout, s in sorted(scores.items()):
+        print(f"{layout:24} {s['docs']:5d} {s['vendor'] / s['docs']:7.0%} "
+              f"{s['fields_ok'] / max(1, s['fields']):7.0%} {s['items_ok'] / max(1, s['items']):7.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
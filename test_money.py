@@ -0,0 +1,138 @@
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+from money import (BATCH_MAX_PAISE, MAX_PAISE, TOTAL_FIELDS, InvoiceTotals, check_totals_batch, format_paise, format_paise_batch,
+                   gst_split, gst_split_batch, rate_hundredths, to_paise)
+
+
+def taxable_half_up(amount: int, rate: int) -> int:
+    """amount * 100 / (100 + rate), rounded half-up to the paisa, in Decimal"""
+    return int((Decimal(amount) * 10000 / (10000 + rate)).to_integral_value(ROUND_HALF_UP))
+
+
+def test_to_paise():
+    assert to_paise("1,234.5") == 123450
+    assert to_paise(" 12 ") == 1200
+    assert to_paise(99.99) == 9999
+    assert to_paise("0.005") == 1
+    assert to_paise("0.0049") == 0
+    assert to_paise("-0.005") == -1
+    for blank in ("", None, "abc", "NaN", "Infinity"):
+        assert to_paise(blank) == 0
+    # Past what the typed output holds: OCR noise, treated as unparseable
+    assert to_paise("9999999999999999.99") == MAX_PAISE
+    assert to_paise("-9999999999999999.99") == -MAX_PAISE
+    for huge in ("10000000000000000", "9999999999999999.995", "123456789012345678901", "1e30"):
+        assert to_paise(huge) == 0, huge
+
+
+def test_format_paise():
+    assert format_paise(123450) == "1234.50"
+    assert format_paise(5) == "0.05"
+    assert format_paise(-5) == "-0.05"
+    values = [0, 7, -7, 100, 123450, -123456]
+    assert format_paise_batch(np.array(values)) == [format_paise(v) for v in values]
+
+
+def test_rate_hundredths():
+    assert rate_hundredths("18") == 1800
+    assert rate_hundredths("12.5") == 1250
+    assert rate_hundredths("0.1") == 10
+    assert rate_hundredths("") == 0
+    assert rate_hundredths("inf") == 0
+
+
+def test_split_adds_up():
+    rng = random.Random(25)
+    for _ in range(5000):
+        amount = rng.randint(-10 ** 9, 10 ** 9)
+        rate = rng.choice([0, 250, 500, 1200, 1800, 2800, rng.randint(0, 10000)])
+        cgst, sgst, igst = gst_split(amount, rate)
+        taxable = amount - cgst - sgst - igst
+        assert taxable == taxable_half_up(amount, rate), (amount, rate)
+        assert igst == 0
+        assert abs(cgst) - abs(sgst) in (0, 1)  # CGST takes the odd paisa
+        assert gst_split(-amount, rate) == (-cgst, -sgst, 0)
+
+        cgst, sgst, igst = gst_split(amount, rate, inter=True)
+        assert (cgst, sgst) == (0, 0)
+        assert amount - igst == taxable
+
+
+def test_split_half_up_edges():
+    # 14 paise at 12%: taxable is exactly 12.5 paise -> 13, leaving 1 paisa of GST for CGST
+    assert gst_split(14, 1200) == (1, 0, 0)
+    # At 100% the taxable half of an odd amount is always x.5
+    assert gst_split(3, 10000) == (1, 0, 0)     # taxable 2, GST 1
+    assert gst_split(101, 10000) == (25, 25, 0)   # taxable 51, GST 50
+    assert gst_split(118000, 1800) == (9000, 9000, 0)
+    assert gst_split(113, 1800) == (9, 8, 0)   # taxable 95.76 -> 96, GST 17
+    # A credit note splits into the negated parts
+    assert gst_split(-14, 1200) == (-1, 0, 0)
+    assert gst_split(-113, 1800) == (-9, -8, 0)
+    assert gst_split(0, 1800) == (0, 0, 0)
+    assert gst_split(5000, 0) == (0, 0, 0)
+
+
+def test_split_batch_matches_scalar():
+    rng = np.random.default_rng(25)
+    amounts = rng.integers(-10 ** 9, 10 ** 9, 20000)
+    rates = rng.choice([0, 250, 500, 1200, 1800, 2800, 1250], 20000)
+    inter = rng.random(20000) < 0.3
+    # Amounts up to MAX_PAISE overflow int64 in the split arithmetic - those take the scalar path
+    amounts[:2000] = rng.integers(-MAX_PAISE, MAX_PAISE, 2000)
+    amounts[2000:2004] = [MAX_PAISE, -MAX_PAISE, BATCH_MAX_PAISE, 50000000000000000]
+    cgst, sgst, igst = gst_split_batch(amounts, rates, inter)
+    for i in range(len(amounts)):
+        expected = gst_split(int(amounts[i]), int(rates[i]), bool(inter[i]))
+        assert (cgst[i], sgst[i], igst[i]) == expected, (amounts[i], rates[i], inter[i])
+
+
+def test_totals_check_batch_matches_scalar():
+    rng = random.Random(25)
+    totals = InvoiceTotals()
+    keys, stated = [], {name: ([], []) for name in TOTAL_FIELDS}
+    sums = {name: [] for name in TOTAL_FIELDS}
+    for n in range(200):
+        rows = [(rng.randint(100, 10 ** 7), rng.choice([500, 1200, 1800])) for _ in range(rng.randint(1, 4))]
+        inter = n % 5 == 0
+        parts = [(amount,) + gst_split(amount, rate, inter) for amount, rate in rows]
+        summed = {"amount": sum(p[0] for p in parts), "cgst_amount": sum(p[1] for p in parts),
+                  "sgst_amount": sum(p[2] for p in parts), "igst_amount": sum(p[3] for p in parts)}
+        summed["taxable"] = summed["amount"] - summed["cgst_amount"] - summed["sgst_amount"] - summed["igst_amount"]
+        # Some invoices print a total a few paise (or rupees) off, some leave a total out
+        printed = {name: value + rng.choice([0, 0, 0, 1, -1, 40, -60]) for name, value in summed.items()
+                   if rng.random() > 0.1}
+        header = {"file_name": f"f{n % 7}.pdf", "invoice_number": str(n)}
+        header.update({total: format_paise(printed[name]) for name, total in TOTAL_FIELDS.items()
+                       if name in printed})
+        for amount, cgst, sgst, igst in parts:
+            totals.add(header, amount, cgst, sgst, igst)
+
+        keys.append((header["file_name"], header["invoice_number"]))
+        for name in TOTAL_FIELDS:
+            stated[name][0].append(name in printed)
+            stated[name][1].append(printed.get(name, 0))
+            sums[name].append(summed[name])
+
+    batch = check_totals_batch(
+        keys, {name: (np.array(given), np.array(values, dtype=np.int64)) for name, (given, values) in stated.items()},
+        {name: np.array(values, dtype=np.int64) for name, values in sums.items()},
+    )
+    scalar = totals.checks()
+    assert scalar and batch == scalar
+    # The grand total tolerates the rupee round-off, the others no difference at all
+    assert {c["field"] for c in scalar if c["difference"] in ("0.01", "-0.01")} <= \
+        set(TOTAL_FIELDS.values()) - {"grand_total"}
+
+
+if __name__ == "__main__":
+    for test in (test_to_paise, test_format_paise, test_rate_hundredths, test_split_adds_up,
+                 test_split_half_up_edges, test_split_batch_matches_scalar, test_totals_check_batch_matches_scalar):
+        try:
+            test()
+            print("✅", test.__name__)
+        except AssertionError as e:
+            print("❌", test.__name__, e)
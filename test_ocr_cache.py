@@ -0,0 +1,103 @@
+import sqlite3
+import tempfile
+import time
+
+from PIL import Image
+
+import app
+from ocr_cache import OCRCache
+
+
+def stored(cache: OCRCache, sql: str):
+    with sqlite3.connect(cache.path) as db:
+        return db.execute(sql).fetchone()[0]
+
+
+def stats_without_flush(cache: OCRCache):
+    with sqlite3.connect(cache.path) as db:
+        counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+    return counters.get("hits", 0), counters.get("misses", 0)
+
+
+def test_counts_are_written_on_flush():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(tmp)
+        cache.put("a", "text")
+        assert cache.get("a") == "text"
+        assert cache.get("b") is None
+        assert stored(cache, "SELECT COUNT(*) FROM counters WHERE name IN ('hits', 'misses')") == 0
+        cache.flush()
+        assert stats_without_flush(cache) == (1, 1)
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_running_byte_total():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(tmp)
+        cache.put("a", "x" * 10)
+        cache.put("b", "é" * 5)                 # 10 bytes of UTF-8
+        cache.put("a", "x" * 4)                 # replaced: counted once
+        assert cache.stats()["bytes"] == 14 == stored(cache, "SELECT SUM(size) FROM entries")
+        cache.clear()
+        assert cache.stats()["bytes"] == 0
+        cache.put("c", "xyz")
+        assert cache.stats()["bytes"] == 3
+
+
+def test_total_of_older_cache_is_summed_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(tmp)
+        cache.put("a", "x" * 7)
+        with sqlite3.connect(cache.path) as db:
+            db.execute("DELETE FROM counters")
+        assert OCRCache(tmp).stats()["bytes"] == 7
+
+
+def test_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(tmp, max_bytes=30)
+        cache.put("old", "x" * 10)
+        time.sleep(0.01)
+        cache.put("used", "x" * 10)
+        time.sleep(0.01)
+        assert cache.get("old")                 # now more recent than "used"
+        time.sleep(0.01)
+        cache.put("new", "x" * 15)
+        assert cache.get("used") is None
+        assert cache.get("old") and cache.get("new")
+        assert cache.stats()["bytes"] == 25 == stored(cache, "SELECT SUM(size) FROM entries")
+
+
+class FixedBackend:
+    def __init__(self, text: str):
+        self.text = text
+
+    def image_to_string(self, img, lang, config):
+        return self.text
+
+
+def test_key_includes_engine():
+    saved = app._ocr_backend, app._ocr_cache, app.OCR_CACHE_DIR, app.OCR_ENGINE
+    img = Image.new("L", (40, 20), 255)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            app._ocr_cache, app.OCR_CACHE_DIR = None, tmp
+            for engine in ("pytesseract", "tesserocr"):
+                app._ocr_backend, app.OCR_ENGINE = FixedBackend(f"from {engine}"), engine
+                assert app.ocr_image_to_text(img) == f"from {engine}"
+            # Cached per engine: switching back serves that engine's text, not the other's
+            app._ocr_backend, app.OCR_ENGINE = FixedBackend("not cached"), "pytesseract"
+            assert app.ocr_image_to_text(img) == "from pytesseract"
+    finally:
+        app._ocr_backend, app._ocr_cache, app.OCR_CACHE_DIR, app.OCR_ENGINE = saved
+
+
+if __name__ == "__main__":
+    for test in (test_counts_are_written_on_flush, test_running_byte_total,
+                 test_total_of_older_cache_is_summed_once, test_evicts_least_recently_used,
+                 test_key_includes_engine):
+        try:
+            test()
+            print("✅", test.__name__)
+        except AssertionError as e:
+            print("❌", test.__name__, e)
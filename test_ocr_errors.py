@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+
+import fitz
+
+import app
+
+
+class FailingBackend:
+    name = "failing"
+
+    def image_to_string(self, img, lang, config):
+        raise RuntimeError("tesseract failed")
+
+
+def blank_scan(path: str) -> None:
+    """A page with no text layer, so it is rendered and OCR'd"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.draw_rect(fitz.Rect(72, 72, 300, 120), color=(0, 0, 0), fill=(0, 0, 0))
+    doc.save(path)
+    doc.close()
+
+
+def test_failed_ocr_releases_render():
+    unraisable = []
+    hook, backend, cache_dir = sys.unraisablehook, app._ocr_backend, app.OCR_CACHE_DIR
+    sys.unraisablehook = unraisable.append
+    app._ocr_backend, app.OCR_CACHE_DIR = FailingBackend(), ""
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "scan.pdf")
+            blank_scan(path)
+            try:
+                app.ocr_pdf_to_text(path)
+            except RuntimeError as e:
+                error = e
+            else:
+                error = None
+            assert isinstance(error, RuntimeError)
+            del error
+    finally:
+        sys.unraisablehook, app._ocr_backend, app.OCR_CACHE_DIR = hook, backend, cache_dir
+    # Freeing the pixmap while its samples are still viewed raises BufferError in __del__
+    assert not [u for u in unraisable if isinstance(u.exc_value, BufferError)], unraisable
+
+
+if __name__ == "__main__":
+    try:
+        test_failed_ocr_releases_render()
+        print("✅ test_failed_ocr_releases_render")
+    except AssertionError as e:
+        print("❌ test_failed_ocr_releases_render", e)
@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+import outputs
+from outputs import QUANTITY_PLACES, parse_decimal
+
+
+def test_parse_decimal():
+    assert parse_decimal("1,234.5") == Decimal("1234.50")
+    assert parse_decimal("2.005") == Decimal("2.01")
+    assert parse_decimal("1.2345", QUANTITY_PLACES) == Decimal("1.235")
+    assert parse_decimal("") is None
+    assert parse_decimal("abc") is None
+    assert parse_decimal("NaN") is None
+
+
+def test_parse_decimal_out_of_range():
+    assert parse_decimal("9999999999999999.99") == Decimal("9999999999999999.99")
+    assert parse_decimal("99999999999999999.99") is None
+    assert parse_decimal("1.2345678901234567e+19") is None
+    assert parse_decimal("1e30") is None
+    assert parse_decimal("1e30", QUANTITY_PLACES) is None
+
+
+def test_columns_accept_out_of_range():
+    if outputs.pa is None:
+        return
+    amounts = outputs._column("amount", ["12.5", "1.2345678901234567e+19", "1e30"])
+    assert amounts.to_pylist() == [Decimal("12.50"), None, None]
+    quantities = outputs._column("quantity", ["3", "1e16"])
+    assert quantities.to_pylist() == [Decimal("3.000"), None]
+
+
+if __name__ == "__main__":
+    for test in (test_parse_decimal, test_parse_decimal_out_of_range, test_columns_accept_out_of_range):
+        try:
+            test()
+            print("✅", test.__name__)
+        except Exception as e:
+            print("❌", test.__name__, repr(e))
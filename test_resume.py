@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+
+import app
+from manifest import RunManifest, file_signature
+from ocr_backend import engine_name
+from pattern_registry import load_patterns
+
+
+def test_fingerprint_covers_vendors_and_ocr_settings():
+    base = app.run_fingerprint(load_patterns("patterns.json", app.VENDOR_MASTER))
+    assert base == app.run_fingerprint(load_patterns("patterns.json", app.VENDOR_MASTER))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(app.VENDOR_MASTER, "r", encoding="utf-8") as f:
+            vendors = json.load(f)
+        vendors.pop(next(iter(vendors)))
+        changed = os.path.join(tmp, "vendors.json")
+        with open(changed, "w", encoding="utf-8") as f:
+            json.dump(vendors, f)
+        assert app.run_fingerprint(load_patterns("patterns.json", changed)) != base
+    assert app.run_fingerprint(load_patterns("patterns.json", "")) != base
+
+    patterns = load_patterns("patterns.json", app.VENDOR_MASTER)
+    other_engine = "pytesseract" if engine_name(app.OCR_ENGINE) == "tesserocr" else "tesserocr"
+    for setting, value in (("OCR_ENGINE", other_engine), ("OCR_DPI", 200), ("OCR_CONFIG", "--psm 4"),
+                           ("OCR_GRAYSCALE", False), ("ADAPTIVE_DPI", True), ("AUTO_DESKEW", False),
+                           ("OCR_IMAGE_MIN_AREA", 0.2), ("OCR_TEXT_COVERAGE", 0.5)):
+        saved = getattr(app, setting)
+        setattr(app, setting, value)
+        try:
+            assert app.run_fingerprint(patterns) != base, setting
+        finally:
+            setattr(app, setting, saved)
+    assert app.run_fingerprint(patterns) == base
+
+
+def test_manifest_resume():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bill.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.7 invoice")
+        manifest = RunManifest(os.path.join(tmp, "manifest.sqlite"))
+        try:
+            assert not manifest.is_done(path, "a")
+            manifest.record(path, "a", [{"invoice_number": "1"}], 0.1)
+            assert manifest.is_done(path, "a")
+            assert not manifest.is_done(path, "b")             # other patterns/vendors/OCR settings
+            assert manifest.rows(path) == [{"invoice_number": "1"}]
+
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+            assert manifest.is_done(path, "a")                 # touched, same content
+
+            with open(path, "ab") as f:
+                f.write(b" changed")
+            assert not manifest.is_done(path, "a")
+
+            manifest.record(path, "a", [], 0.1, "timed out")
+            assert not manifest.is_done(path, "a")             # failed files are retried
+
+            # Rewritten while it was processed: recorded as the version that was read
+            before = file_signature(path)
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.7 rewritten")
+            manifest.record(path, "a", [{"invoice_number": "1"}], 0.1, signature=before)
+            assert not manifest.is_done(path, "a")
+        finally:
+            manifest.close()
+
+
+if __name__ == "__main__":
+    for test in (test_fingerprint_covers_vendors_and_ocr_settings, test_manifest_resume):
+        try:
+            test()
+            print("✅", test.__name__)
+        except AssertionError as e:
+            print("❌", test.__name__, e)
@@ -0,0 +1,33 @@
+import glob
+
+import fitz
+from PIL import Image
+
+import preprocess
+
+# A page turned by `turn` degrees (counter-clockwise) is put back by this angle
+EXPECTED = {0: 0, 90: 270, 180: 180, 270: 90}
+
+
+def render(path: str, dpi: int) -> Image.Image:
+    pix = fitz.open(path)[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return Image.frombytes("L", (pix.width, pix.height), pix.samples)
+
+
+def check(path: str, dpi: int) -> dict:
+    """{turn: estimated angle} for the first page of `path` turned every quarter"""
+    img = render(path, dpi)
+    return {turn: preprocess.estimate_rotation(img.rotate(turn, expand=True))[0] for turn in EXPECTED}
+
+
+def test_invoice_orientation():
+    for path in sorted(glob.glob("invoice/*.pdf")):
+        for dpi in (100, 200):
+            assert check(path, dpi) == EXPECTED, (path, dpi)
+
+
+if __name__ == "__main__":
+    for path in sorted(glob.glob("invoice/*.pdf")):
+        for dpi in (100, 200):
+            found = check(path, dpi)
+            print("✅" if found == EXPECTED else "❌", path, dpi, found)
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import tempfile
+
+import app
+import synth_invoices
+from pattern_registry import load_patterns
+from service import InvoiceService
+
+
+async def request(port: int, head: bytes, body: bytes = b"", wait: bool = True):
+    """(status, response body) of one request; with wait=False the body is sent only after the response"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(head + (body if wait else b""))
+    await writer.drain()
+    status_line = await reader.readline()
+    response = await reader.read()
+    writer.close()
+    return int(status_line.split()[1]), json.loads(response.partition(b"\r\n\r\n")[2] or b"null")
+
+
+def upload_head(length: int, query: str = "?name=bill.pdf", content_type: str = "application/pdf") -> bytes:
+    return (f"POST /invoices{query} HTTP/1.1\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {length}\r\n\r\n").encode("latin-1")
+
+
+async def _run(pdf: bytes):
+    service = InvoiceService(load_patterns("patterns.json", app.VENDOR_MASTER), workers=1, queue_size=0)
+    await service.start()
+    server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        status, body = await request(port, upload_head(len(pdf)), pdf)
+        assert status == 200 and body["Data"], (status, body)
+        assert body["Data"][0]["file_name"] == "bill.pdf"
+
+        boundary = "formboundary"
+        form = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"C:\\\\in\\\\form.pdf\"\r\n"
+                f"Content-Type: application/pdf\r\n\r\n").encode("latin-1") + pdf + f"\r\n--{boundary}--\r\n".encode()
+        status, body = await request(port, upload_head(len(form), "", f"multipart/form-data; boundary={boundary}"),
+                                     form)
+        assert status == 200 and body["Data"][0]["file_name"] == "form.pdf", (status, body)
+
+        status, body = await request(port, upload_head(len(pdf), "?name=bill.txt"), pdf)
+        assert status == 415, status
+
+        # No room: refused from the headers alone - the body is never sent before the answer
+        service.busy = service.workers
+        status, body = await asyncio.wait_for(request(port, upload_head(len(pdf)), pdf, wait=False), 10)
+        assert status == 503 and body["retry_after"], (status, body)
+        service.busy = 0
+        assert service.counters["rejected"] == 1 and service.queued == 0
+        assert not os.listdir(service._spool_dir)
+    finally:
+        server.close()
+        service.close()
+
+
+def test_service_uploads():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = synth_invoices.generate(tmp, 1, seed=3)[0]
+        with open(path, "rb") as f:
+            pdf = f.read()
+    asyncio.run(_run(pdf))
+
+
+if __name__ == "__main__":
+    try:
+        test_service_uploads()
+        print("✅ test_service_uploads")
+    except AssertionError as e:
+        print("❌ test_service_uploads", e)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from watch import Debouncer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_debouncer_settles_empty_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        empty = os.path.join(tmp, "empty.pdf")
+        open(empty, "wb").close()
+        debouncer = Debouncer(settle=0.2)
+        debouncer.add([empty])
+        assert debouncer.ready() == []          # first sight only records the signature
+        time.sleep(0.3)
+        assert debouncer.ready() == [empty]
+        assert not debouncer.pending
+
+
+def test_debouncer_waits_for_growing_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "growing.pdf")
+        with open(path, "wb") as f:
+            f.write(b"%PDF")
+        debouncer = Debouncer(settle=0.2)
+        debouncer.add([path])
+        debouncer.ready()
+        time.sleep(0.3)
+        with open(path, "ab") as f:
+            f.write(b"-1.7")
+        assert debouncer.ready() == []          # changed: the settle time starts again
+        time.sleep(0.3)
+        assert debouncer.ready() == [path]
+
+
+def test_once_exits_with_empty_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("patterns.json", "vendors.json"):
+            shutil.copy(os.path.join(HERE, name), tmp)
+        os.makedirs(os.path.join(tmp, "invoice"))
+        open(os.path.join(tmp, "invoice", "empty.pdf"), "wb").close()
+        env = dict(os.environ, PYTHONPATH=HERE)
+        done = subprocess.run([sys.executable, os.path.join(HERE, "watch.py"), "--once", "--settle", "0.2"],
+                              cwd=tmp, env=env, capture_output=True, text=True, timeout=60)
+        assert done.returncode == 0, done.stderr
+        assert "1 failed" in done.stdout, done.stdout
+
+
+if __name__ == "__main__":
+    for test in (test_debouncer_settles_empty_file, test_debouncer_waits_for_growing_file,
+                 test_once_exits_with_empty_file):
+        try:
+            test()
+            print("✅", test.__name__)
+        except Exception as e:
+            print("❌", test.__name__, repr(e))
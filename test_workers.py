@@ -0,0 +1,31 @@
+import os
+
+import app
+
+
+def test_page_workers_split_cores():
+    cores = os.cpu_count() or 1
+    assert app.page_workers(1) == app.PAGE_WORKERS
+    for workers in range(1, 2 * cores + 2):
+        threads = app.page_workers(workers)
+        assert 1 <= threads <= app.PAGE_WORKERS
+        # Never more OCR threads than cores, unless there are more processes than cores
+        assert workers * threads <= max(cores, workers), (workers, threads)
+
+
+def test_worker_init_sets_page_threads():
+    saved = app._PAGE_WORKERS, app._WORKER_PATTERNS
+    try:
+        app._init_worker({}, 1)
+        assert app._PAGE_WORKERS == 1
+    finally:
+        app._PAGE_WORKERS, app._WORKER_PATTERNS = saved
+
+
+if __name__ == "__main__":
+    for test in (test_page_workers_split_cores, test_worker_init_sets_page_threads):
+        try:
+            test()
+            print("✅", test.__name__)
+        except AssertionError as e:
+            print("❌", test.__name__, e)
@@ -6,6 +6,8 @@ import pytesseract
 from PIL import Image, ImageOps, ImageFilter
 import fitz
 
+from app import ocr_image_to_text  # shares the persistent OCR cache
+
 INPUT_FOLDERS = ["invoice"]
 OUTPUT_DIR = "output"
 
@@ -72,11 +74,11 @@ text = page.get_text().strip()
 if not text:
     pix = page.get_pixmap(dpi=300)
     img = Image.frombytes('RGB', [pix.width, pix.height], pix.samples)
-    text = pytesseract.image_to_string(img, lang='eng')
+    text = ocr_image_to_text(img, config='')
 else:
     pix = page.get_pixmap(dpi=300)
     img = Image.frombytes('RGB', [pix.width, pix.height], pix.samples)
-    text = pytesseract.image_to_string(img, lang='eng')
+    text = ocr_image_to_text(img, config='')
 
 vendor = detect_vendor(text, patterns)
 header = extract_header(text, vendor, patterns)
@@ -0,0 +1,272 @@
+# File - watch.py
+"""
+Watch mode: extract invoices as they land in INPUT_FOLDERS.
+
+    python watch.py [--workers N] [--poll S] [--settle S] [--once]
+
+On start every file under INPUT_FOLDERS that the manifest doesn't already
+have (unchanged, with the current patterns, vendors and OCR settings) is
+processed. After that the folders are watched - with watchdog's native
+notifications when it is installed, otherwise by rescanning them every
+--poll seconds. A new or changed file is only picked up once its size and
+mtime have held still for --settle seconds, so half-copied files are never
+read. Rows are appended to result.ndjson and recorded in the manifest as
+each file finishes.
+
+A changed invoice appends its new rows; on exit (Ctrl-C/SIGTERM, or after the first
+pass with --once) result.ndjson is rewritten from the manifest so it holds
+each current file once, and result.json/result.xlsx (and the typed
+COLUMNAR_OUTPUT) are derived from it.
+"""
+import os
+import time
+import queue
+import signal
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import app
+from manifest import RunManifest
+from metrics import Metrics
+import outputs
+from outputs import NDJSONWriter, ndjson_to_columnar, ndjson_to_json, ndjson_to_excel
+from pattern_registry import load_patterns
+from records import materialize
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional
+    Observer = None
+
+
+def manifest_path(path: str) -> str:
+    """The path as main() walks it ("./invoice/x.pdf"), which is what the manifest is keyed by"""
+    return os.path.join(".", os.path.relpath(path))
+
+
+def iter_watched(folders: List[str]) -> Iterator[str]:
+    for folder in folders:
+        if os.path.isdir(folder):
+            yield from app.iter_input_files(manifest_path(folder))
+
+
+def _signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class PollingWatcher:
+    """Rescans the folders; changes() lists files that are new or differ from the last scan"""
+
+    name = "polling"
+
+    def __init__(self, folders: List[str], interval: float = app.WATCH_POLL):
+        self.folders = folders
+        self.interval = interval
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self._next = 0.0
+        self.changes()
+
+    def changes(self) -> List[str]:
+        now = time.monotonic()
+        if now < self._next:
+            return []
+        self._next = now + self.interval
+        seen, changed = {}, []
+        for path in iter_watched(self.folders):
+            sig = _signature(path)
+            if sig is None:
+                continue
+            seen[path] = sig
+            if self._seen.get(path) != sig:
+                changed.append(path)
+        self._seen = seen
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class WatchdogWatcher:
+    """Native file system notifications (inotify, FSEvents, ...) through watchdog"""
+
+    name = "watchdog"
+
+    def __init__(self, folders: List[str]):
+        self._events: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        events = self._events
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                path = getattr(event, "dest_path", None) or event.src_path
+                if os.path.splitext(path)[1].lower() in app.SUPPORTED_EXT:
+                    events.put(manifest_path(os.fsdecode(path)))
+
+        self._observer = Observer()
+        for folder in folders:
+            if os.path.isdir(folder):
+                self._observer.schedule(Handler(), folder, recursive=True)
+        self._observer.start()
+
+    def changes(self) -> List[str]:
+        changed = []
+        while True:
+            try:
+                changed.append(self._events.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def close(self) -> None:
+        self._observer.stop()
+        self._observer.join()
+
+
+def make_watcher(folders: List[str], poll: float = app.WATCH_POLL):
+    if Observer is not None:
+        return WatchdogWatcher(folders)
+    return PollingWatcher(folders, poll)
+
+
+class Debouncer:
+    """
+    Holds candidate files until their (size, mtime) has been stable for
+    `settle` seconds. An empty file settles like any other - it is then
+    recorded as failed, and picked up again if it is ever written to.
+    """
+
+    def __init__(self, settle: float = app.WATCH_SETTLE):
+        self.settle = settle
+        # path -> ((size, mtime_ns), monotonic time it was first seen with that signature)
+        self.pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+
+    def add(self, paths: List[str]) -> None:
+        for path in paths:
+            self.pending.setdefault(path, ((-1, -1), 0.0))
+
+    def ready(self) -> List[str]:
+        now = time.monotonic()
+        settled = []
+        for path, (last, since) in list(self.pending.items()):
+            sig = _signature(path)
+            if sig is None:
+                del self.pending[path]          # deleted/renamed away before it settled
+            elif sig != last:
+                self.pending[path] = (sig, now)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                settled.append(path)
+        return sorted(settled)
+
+
+class Ingestor:
+    """Processes settled files and appends their rows to the outputs"""
+
+    def __init__(self, patterns, workers: int = app.WORKERS):
+        self.patterns = patterns
+        self.fingerprint = app.run_fingerprint(patterns)
+        self.workers = workers
+        self.manifest = RunManifest(app.MANIFEST_PATH)
+        self.writer = NDJSONWriter(app.NDJSON_OUTPUT, append=True)
+        self.metrics = Metrics()
+        self.files = 0
+        self.failed = 0
+
+    def run(self, paths: List[str]) -> None:
+        todo = [p for p in paths if not self.manifest.is_done(p, self.fingerprint)]
+        # A single file is run in-process: no pool start-up on the drop-to-row path
+        workers = min(self.workers, len(todo))
+        for result in app.process_files(todo, self.patterns, workers=workers):
+            self.metrics.merge(result.metrics)
+            rows = materialize(result.rows)
+            with self.metrics.stage("post_process", nbytes=len(rows)):
+                checks = app.post_process(rows)
+            with self.metrics.stage("write"):
+                self.writer.write(rows)
+                self.manifest.record(result.path, self.fingerprint, rows,
+                                     result.seconds, result.error, result.signature)
+            self.metrics.events.clear()
+            self.files += 1
+            if result.error:
+                self.failed += 1
+                print(f" ✗ {result.path}: {result.error}")
+            else:
+                print(f" ✓ {result.path}: {len(rows)} row(s) in {result.seconds:.2f}s")
+            for check in checks:
+                print(f"   ⚠ {check['field']} {check['stated']} but rows add up to {check['computed']}")
+
+    def close(self, folders: List[str]) -> None:
+        """Rewrite result.ndjson from the manifest (one copy per current file) and derive JSON/Excel"""
+        self.writer.close()
+        with NDJSONWriter(app.NDJSON_OUTPUT) as writer:
+            for path in iter_watched(folders):
+                writer.write(self.manifest.rows(path))
+        self.manifest.close()
+        ndjson_to_json(app.NDJSON_OUTPUT, app.JSON_OUTPUT)
+        if writer.rows:
+            ndjson_to_excel(app.NDJSON_OUTPUT, app.EXCEL_OUTPUT)
+        if app.COLUMNAR_OUTPUT and outputs.pa is not None:
+            ndjson_to_columnar(app.NDJSON_OUTPUT, app.COLUMNAR_OUTPUT)
+        print(f" NDJSON: {app.NDJSON_OUTPUT} ({writer.rows} rows)")
+        print(f" JSON  : {app.JSON_OUTPUT}")
+        print(f" EXCEL : {app.EXCEL_OUTPUT}")
+        if app.COLUMNAR_OUTPUT and outputs.pa is not None:
+            print(f" TYPED : {app.COLUMNAR_OUTPUT}")
+
+
+# ================= MAIN ================= #
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=app.WORKERS)
+    parser.add_argument("--poll", type=float, default=app.WATCH_POLL, help="rescan interval without watchdog")
+    parser.add_argument("--settle", type=float, default=app.WATCH_SETTLE,
+                        help="seconds a file must stay unchanged before it is read")
+    parser.add_argument("--once", action="store_true", help="process what is there and exit")
+    args = parser.parse_args(argv)
+
+    os.makedirs(app.OUTPUT_DIR, exist_ok=True)
+    # Compiled and validated once; a bad regex stops here
+    patterns = load_patterns("patterns.json", app.VENDOR_MASTER)
+    folders = app.INPUT_FOLDERS
+    ingestor = Ingestor(patterns, args.workers)
+
+    # Stopping the service (SIGTERM) finishes the outputs like Ctrl-C does
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"🔥 WATCHING {', '.join(folders)} 🔥")
+    debouncer = Debouncer(args.settle)
+    tick = min(0.5, args.poll, args.settle) or 0.5
+    watcher = None
+    try:
+        # Whatever is already there (and not in the manifest) first - it may
+        # still be being copied in, so it goes through the debouncer as well
+        watcher = None if args.once else make_watcher(folders, args.poll)
+        debouncer.add(list(iter_watched(folders)))
+        if watcher is not None:
+            print(f" using {watcher.name} (settle {args.settle:g}s) - Ctrl-C to stop")
+        while watcher is not None or debouncer.pending:
+            if watcher is not None:
+                debouncer.add(watcher.changes())
+            settled = debouncer.ready()
+            if settled:
+                ingestor.run(settled)
+            time.sleep(tick)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.close()
+        ingestor.close(folders)
+        print(f" PROCESSED: {ingestor.files} file(s), {ingestor.failed} failed")
+        if ingestor.metrics.stages:
+            print(ingestor.metrics.report())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())